@@ -1,16 +1,40 @@
 import copy
+import gc
+from collections.abc import Callable, Generator, Iterable, Iterator
+from datetime import datetime
+from itertools import islice
 from typing import Optional, Union
 
 import pandas as pd
-from openpyxl.cell import Cell
+from openpyxl import Workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.cell.cell import ERROR_CODES, ILLEGAL_CHARACTERS_RE, get_time_format
+from openpyxl.styles.numbers import is_date_format
 from openpyxl.utils import column_index_from_string
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.utils.dataframe import dataframe_to_rows, expand_index
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
 from openpyxl.worksheet.cell_range import CellRange
 from openpyxl.worksheet.worksheet import Worksheet
-
-import analyzers
+from openpyxl.xml.constants import MAX_ROW
+from pandas.api.types import infer_dtype, is_bool_dtype, is_datetime64_dtype, is_numeric_dtype
+
+from profiling import add_rows, timed
+from report_tables import (  # noqa: F401 (the compute steps and sheet_tasks used to live here)
+    compute_general_sheet,
+    compute_highest_scores_sheet,
+    compute_most_played_charts_sheet,
+    compute_most_played_packs_sheet,
+    compute_most_played_songs_sheet,
+    compute_pack_completion_sheet,
+    compute_recently_played_packs_sheet,
+    sheet_tasks,
+)
 from table_stats import TableStats
 
+# number format openpyxl gives cells holding a datetime
+DATETIME_FORMAT = get_time_format(datetime)
+
 
 def strip_prefix(string: str, prefix: str) -> str:
     """Strip prefix from string if it exists"""
@@ -58,11 +82,116 @@ def copy_columns(ws: Worksheet, column_range: CellRange, dest_column: Union[str,
         ws.merge_cells(cr.coord)
 
 
+def column_values(column: pd.Series) -> tuple[list, Optional[str]]:
+    """
+    Convert a column to plain Python objects which openpyxl can store
+    (numpy scalars -> int/float/bool, datetime64 -> Timestamp), with missing values (NaN, NaT) as None.
+
+    Also returns the openpyxl data type of the (non-missing) values, if the whole column can be vetted at once:
+    numbers, booleans, dates, and strings that openpyxl won't reject or read as formulas/error codes.
+    Otherwise None, and each value has to go through the usual cell.value checks.
+    """
+    values = column.astype(object).where(column.notna(), None).tolist()
+    if is_bool_dtype(column.dtype):
+        return values, "b"
+    if is_numeric_dtype(column.dtype):
+        return values, "n"
+    if is_datetime64_dtype(column.dtype):
+        return values, "d"
+
+    # categoricals only need their categories checked
+    strings = column.cat.categories if isinstance(column.dtype, pd.CategoricalDtype) else column.dropna()
+    if infer_dtype(strings, skipna=False) == "string" and not (
+        (strings.str.len() > 32767).any()
+        or strings.str.startswith("=").any()
+        or strings.isin(ERROR_CODES).any()
+        or strings.str.contains(ILLEGAL_CHARACTERS_RE).any()
+    ):
+        return values, "s"
+    return values, None
+
+
+def write_rows(ws: Worksheet, rows: Iterable[Iterable], row: int, column: int) -> None:
+    """Write rows of values to a worksheet, starting from (row, column) and going down and right."""
+    for dr, values in enumerate(rows):
+        for dc, value in enumerate(values):
+            ws.cell(row=row + dr, column=column + dc).value = value
+
+
+def write_columns(ws: Worksheet, columns: Iterable[tuple[list, Optional[str]]], row: int, column: int) -> None:
+    """
+    Write columns of values to a worksheet, starting from (row, column) and going right and down.
+    Columns are (values, data type) pairs as returned by column_values().
+
+    Goes straight to the worksheet's cell store rather than through ws.cell() for every value,
+    and skips openpyxl's per-value type checks where the column was already vetted.
+    Cells that already exist (e.g. styled cells from the template) are reused, so they keep their formatting.
+    """
+    cells = ws._cells
+    # new cells for dates start out with a date format, like cell.value would give them
+    date_cell = Cell(ws)
+    date_cell.number_format = DATETIME_FORMAT
+
+    for c, (values, data_type) in enumerate(columns, start=column):
+        new_cell_style = date_cell._style if data_type == "d" else None
+        last_row = row + len(values) - 1
+        if last_row > MAX_ROW:
+            raise ValueError(f"Row numbers must be between 1 and {MAX_ROW}. Row number supplied was {last_row}")
+        for r, value in enumerate(values, start=row):
+            cell = cells.get((r, c))
+            if cell is None:
+                cell = cells[(r, c)] = Cell(ws, row=r, column=c, style_array=new_cell_style)
+            elif data_type == "d" and value is not None and not is_date_format(cell.number_format):
+                cell.number_format = DATETIME_FORMAT
+
+            if value is None:
+                cell._value = None
+                cell.data_type = "n"
+            elif data_type is not None:
+                cell._value = value
+                cell.data_type = data_type
+            else:
+                cell.value = value
+        ws._current_row = max(ws._current_row, last_row)
+
+
+def header_rows(df: pd.DataFrame, index: bool = False, header: bool = False) -> list[list]:
+    """Header rows (and the row of index names) of a table, laid out the same way openpyxl does it"""
+    count = (df.columns.nlevels if header else 0) + (1 if index else 0)
+    return list(islice(dataframe_to_rows(df, index=index, header=header), count))
+
+
+def table_columns(df: pd.DataFrame, index: bool = False) -> list[tuple[list, Optional[str]]]:
+    """Values of a table (and its index) column by column, as (values, data type) pairs from column_values()"""
+    columns = []
+    if index and len(df) > 0:
+        index_values = expand_index(df.index) if df.index.nlevels > 1 else ([v] for v in df.index)
+        columns.extend((list(level), None) for level in zip(*index_values))
+    columns.extend(column_values(df.iloc[:, i]) for i in range(df.shape[1]))
+    return columns
+
+
 def write_table(df: pd.DataFrame, cell: Cell, index: bool = False, header: bool = False) -> None:
     """Write Pandas dataframe to spreadsheet, starting from cell and going down and right"""
-    for dr, row in enumerate(dataframe_to_rows(df, index=index, header=header)):
-        for dc, value in enumerate(row):
-            cell.offset(dr, dc).value = value
+    if isinstance(cell.parent, SheetLayout):
+        cell.parent.add_table(df, cell.row, cell.column, index, header)
+        add_rows(len(df))
+        return
+
+    rows = header_rows(df, index, header)
+    write_rows(cell.parent, rows, cell.row, cell.column)
+    columns = table_columns(df, index)
+
+    # every cell is a new long-lived object, so the garbage collector would keep kicking in
+    # to scan everything while the table is written, for nothing
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        write_columns(cell.parent, columns, cell.row + len(rows), cell.column)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    add_rows(len(df))
 
 
 def write_row(row: list, cell: Cell) -> None:
@@ -71,17 +200,256 @@ def write_row(row: list, cell: Cell) -> None:
         cell.offset(0, dc).value = value
 
 
+# ---------------------------------------------
+#   Streaming output
+#   Filling in the template keeps a cell object for every value of every sheet in memory until the workbook is
+#   saved. For big reports, the write steps can write to a SheetLayout instead, which only notes down where each
+#   table goes. save_streaming() then writes the sheets out row by row with openpyxl's write-only mode,
+#   turning a slice of each table into cells only as its rows come up.
+# ---------------------------------------------
+
+# workbook style tables, shared with the template so its cells' style ids stay valid
+STYLE_TABLES = [
+    "_fonts",
+    "_alignments",
+    "_borders",
+    "_fills",
+    "_number_formats",
+    "_date_formats",
+    "_timedelta_formats",
+    "_protections",
+    "_colors",
+    "_cell_styles",
+    "_named_styles",
+    "_table_styles",
+    "_differential_styles",
+]
+# everything about a worksheet's layout except its cells
+SHEET_LAYOUT_ATTRIBUTES = [
+    "sheet_format",
+    "sheet_properties",
+    "sheet_state",
+    "views",
+    "column_dimensions",
+    "row_dimensions",
+    "merged_cells",
+    "conditional_formatting",
+    "data_validations",
+    "auto_filter",
+    "protection",
+    "defined_names",
+    "page_setup",
+    "page_margins",
+    "print_options",
+    "HeaderFooter",
+    "row_breaks",
+    "col_breaks",
+    "_print_rows",
+    "_print_cols",
+    "_print_area",
+]
+
+
+class LayoutCell:
+    """A cell of a SheetLayout: as much of openpyxl's Cell as the write steps use."""
+
+    def __init__(self, parent: "SheetLayout", row: int, column: int) -> None:  # noqa: D107
+        self.parent = parent
+        self.row = row
+        self.column = column
+
+    @property
+    def value(self) -> object:  # noqa: D102
+        return self.parent.values.get((self.row, self.column), (None, None))[1]
+
+    @value.setter
+    def value(self, value: object) -> None:
+        self.parent.values[(self.row, self.column)] = (self.parent.count_write(), value)
+
+    def offset(self, row: int = 0, column: int = 0) -> "LayoutCell":  # noqa: D102
+        return LayoutCell(self.parent, self.row + row, self.column + column)
+
+
+class SheetLayout:
+    """
+    Stand-in for a worksheet, for the write steps to write to (through write_table, write_row and cell values)
+    when the workbook is streamed out with save_streaming().
+    Records which table or value goes where, without making any cells.
+    """
+
+    def __init__(self) -> None:  # noqa: D107
+        # (row, column) -> (write number, value)
+        self.values: dict[tuple[int, int], tuple[int, object]] = {}
+        # (write number, row, column, table, index, header)
+        self.tables: list[tuple[int, int, int, pd.DataFrame, bool, bool]] = []
+        self._writes = 0
+
+    def count_write(self) -> int:
+        """Count a write and return its number (where writes overlap, the last one wins, like on a worksheet)"""
+        self._writes += 1
+        return self._writes
+
+    def __getitem__(self, coordinate: str) -> LayoutCell:  # noqa: D105
+        return LayoutCell(self, *coordinate_to_tuple(coordinate))
+
+    def cell(self, row: int, column: int) -> LayoutCell:  # noqa: D102
+        return LayoutCell(self, row, column)
+
+    def add_table(self, df: pd.DataFrame, row: int, column: int, index: bool, header: bool) -> None:
+        """Place a table with its top left corner at (row, column), like write_table()"""
+        self.tables.append((self.count_write(), row, column, df, index, header))
+
+    def rows(self, chunk_size: int = 1000) -> Iterator[tuple[int, list[tuple[int, int, list]]]]:
+        """
+        Go through the rows that have anything written to them, in order:
+        (row, [(write number, first column, [(value, data type), ...]), ...]).
+        The data type is from column_values(), or None where the value has to go through the usual cell.value checks.
+        """
+
+        def table_rows(df: pd.DataFrame, index: bool, header: bool) -> Iterator[list[tuple[object, Optional[str]]]]:
+            for values in header_rows(df, index, header):
+                yield [(value, None) for value in values]
+            # only one slice of the table is turned into Python values at a time
+            for start in range(0, len(df), chunk_size):
+                columns = table_columns(df.iloc[start : start + chunk_size], index)
+                types = [data_type for _, data_type in columns]
+                for values in zip(*(values for values, _ in columns)):
+                    yield list(zip(values, types))
+
+        # (first row, write number, first column, rows)
+        pending = [
+            (row, write, column, table_rows(df, index, header)) for write, row, column, df, index, header in self.tables
+        ]
+        pending += [
+            (row, write, column, iter([[(value, None)]])) for (row, column), (write, value) in self.values.items()
+        ]
+        pending.sort(key=lambda p: (p[0], p[1]))
+        active = []
+        row = 0
+        while pending or active:
+            row = row + 1 if active else pending[0][0]
+            while pending and pending[0][0] == row:
+                _, write, column, rows = pending.pop(0)
+                active.append((write, column, rows))
+            writes = []
+            for write, column, rows in active:
+                values = next(rows, None)
+                if values is not None:
+                    writes.append((write, column, values))
+            active = [a for a in active if any(w[0] == a[0] for w in writes)]
+            if writes:
+                yield row, sorted(writes, key=lambda w: w[0])
+
+
+def sheet_data(ws: WriteOnlyWorksheet) -> Generator[None, tuple[int, list[Cell]], None]:
+    """
+    Write the `sheetData` of a write-only worksheet from (row number, cells) sent in order of row.
+    Like WriteOnlyWorksheet.append(), except rows can be skipped, so empty rows don't have to be written out.
+    """
+    xf = ws._writer.xf.send(True)
+    with xf.element("sheetData"):
+        try:
+            while True:
+                row, cells = yield
+                ws._writer.write_row(xf, cells, row)
+        except GeneratorExit:
+            pass
+    ws._writer.xf.send(None)
+
+
+def stream_sheet(ws: WriteOnlyWorksheet, template: Worksheet, layout: Optional[SheetLayout]) -> None:
+    """Write out a sheet of the template, with everything the write step put in `layout`, row by row."""
+    for attribute in SHEET_LAYOUT_ATTRIBUTES:
+        setattr(ws, attribute, getattr(template, attribute))
+
+    # the template's cells by row
+    template_rows: dict[int, dict[int, Cell]] = {}
+    for (r, c), cell in template._cells.items():
+        template_rows.setdefault(r, {})[c] = cell
+    # rows with cells or formatting in the template, in order
+    static_rows = iter(sorted(template_rows.keys() | template.row_dimensions.keys()))
+    layout_rows = layout.rows() if layout is not None else iter(())
+
+    ws._get_writer()
+    ws._rows = sheet_data(ws)
+    next(ws._rows)
+    date_style = WriteOnlyCell(ws)
+    date_style.number_format = DATETIME_FORMAT
+    next_static = next(static_rows, None)
+    next_layout = next(layout_rows, None)
+    while next_static is not None or next_layout is not None:
+        r = min(row for row in (next_static, next_layout and next_layout[0]) if row is not None)
+        cells: dict[int, Cell] = {}
+        for c, template_cell in template_rows.get(r, {}).items():
+            cell = cells[c] = WriteOnlyCell(ws)
+            cell._style = copy.copy(template_cell._style)
+            cell._value = template_cell._value
+            cell.data_type = template_cell.data_type
+
+        if next_layout is not None and next_layout[0] == r:
+            for _, column, values in next_layout[1]:
+                for c, (value, data_type) in enumerate(values, start=column):
+                    cell = cells.get(c)
+                    if cell is None:
+                        cell = cells[c] = WriteOnlyCell(ws)
+                        if data_type == "d":
+                            cell._style = copy.copy(date_style._style)
+                    elif data_type == "d" and value is not None and not is_date_format(cell.number_format):
+                        cell.number_format = DATETIME_FORMAT
+                    # same as write_columns()
+                    if value is None:
+                        cell._value = None
+                        cell.data_type = "n"
+                    elif data_type is not None:
+                        cell._value = value
+                        cell.data_type = data_type
+                    else:
+                        cell.value = value
+            next_layout = next(layout_rows, None)
+        if next_static == r:
+            next_static = next(static_rows, None)
+
+        for c, cell in cells.items():
+            cell.row, cell.column = r, c
+        ws._rows.send((r, [cells[c] for c in sorted(cells)]))
+
+
+@timed()
+def save_streaming(template: Workbook, layouts: dict[str, SheetLayout], path: str) -> None:
+    """
+    Save a copy of the template workbook with the tables written to each sheet's layout, using a write-only workbook:
+    rows are generated and written out one at a time, so memory use doesn't grow with the size of the tables.
+    The template's styles, column widths, merged cells, conditional formatting etc. are copied over as they are.
+    """
+    wb = Workbook(write_only=True)
+    for attribute in STYLE_TABLES:
+        setattr(wb, attribute, getattr(template, attribute))
+    wb.loaded_theme = template.loaded_theme
+    wb.calculation = template.calculation
+    wb.views = template.views
+    for name, definition in template.defined_names.items():
+        wb.defined_names[name] = definition
+
+    for template_ws in template.worksheets:
+        ws = wb.create_sheet(template_ws.title)
+        stream_sheet(ws, template_ws, layouts.get(template_ws.title))
+    wb.save(path)
+
+
 # ---------------------------------------------
 #   Table generation code
 # ---------------------------------------------
 
 
-def create_general_sheet(ws: Worksheet, stats: TableStats, mode_labels: Optional[dict[str, str]] = None) -> None:
-    """Create General sheet"""
-    if mode_labels is None:
-        mode_labels = {"dance-single": "Singles", "dance-double": "Doubles"}
+# Each sheet is split into a compute step, which runs the analyzers and returns the finished tables
+# (pure pandas, safe to run concurrently with other sheets, see report_tables.py),
+# and a write step which puts them into the worksheet.
+
 
-    a = analyzers.chart_counts_for_each_pack(stats, mode_labels)
+@timed()
+def write_general_sheet(ws: Worksheet, tables: dict[str, pd.DataFrame]) -> None:
+    """Write General sheet"""
+    a = tables["chart_counts"]
     write_table(a.reset_index(), ws["A4"])
 
     ws["A3"].value = len(a)  # set pack count
@@ -89,76 +457,102 @@ def create_general_sheet(ws: Worksheet, stats: TableStats, mode_labels: Optional
 
     # render difficulty histogram
     # todo: make sure both tables display packs in the right order
-    a = analyzers.pack_difficulty_histogram(stats)
+    a = tables["histogram"]
     write_table(a.reset_index().drop("pack", axis="columns"), ws["H3"], header=True)
 
 
-def create_most_played_charts_sheet(ws: Worksheet, stats: TableStats, limit: int = 50) -> None:
-    """Create Most Played Charts sheet"""
-    all_songs = analyzers.most_played_charts(stats, limit, modes=["dance-single", "dance-double"])
-    doubles_only = analyzers.most_played_charts(stats, limit, modes=["dance-double"])
-
-    write_table(all_songs, ws["A3"])
-    write_table(doubles_only, ws["I3"])
+@timed()
+def write_most_played_charts_sheet(ws: Worksheet, tables: dict[str, pd.DataFrame]) -> None:
+    """Write Most Played Charts sheet"""
+    write_table(tables["all_songs"], ws["A3"])
+    write_table(tables["doubles_only"], ws["I3"])
 
     # todo: set background colour for extra song entries?
 
 
-def create_most_played_songs_sheet(ws: Worksheet, stats: TableStats, limit: int = 50) -> None:
-    """Create Most Played Songs sheet"""
-    all_songs = analyzers.most_played_songs(stats, limit, modes=["dance-single", "dance-double"])
-    doubles_only = analyzers.most_played_songs(stats, limit, modes=["dance-double"])
-
-    write_table(all_songs, ws["A3"])
-    write_table(doubles_only, ws["A57"])
+@timed()
+def write_most_played_songs_sheet(ws: Worksheet, tables: dict[str, pd.DataFrame]) -> None:
+    """Write Most Played Songs sheet"""
+    write_table(tables["all_songs"], ws["A3"])
+    write_table(tables["doubles_only"], ws["A57"])
 
     # todo: set background colour for extra song entries?
     # todo: doesn't work for limits > 50, decide what to do
 
 
+@timed()
+def write_most_played_packs_sheet(ws: Worksheet, tables: dict[str, pd.DataFrame]) -> None:
+    """Write Most Played Packs sheet"""
+    write_table(tables["packs"].reset_index(), ws["A2"])
+
+
+@timed()
+def write_recently_played_packs_sheet(ws: Worksheet, tables: dict[str, pd.DataFrame]) -> None:
+    """Write Recently Played Packs sheet"""
+    write_table(tables["packs"].reset_index(), ws["A2"])
+
+
+@timed()
+def write_pack_completion_sheet(ws: Worksheet, tables: dict[str, pd.DataFrame]) -> None:
+    """Write Pack Completion sheet"""
+    write_table(tables["completion"].reset_index(), ws["A3"])
+
+
+@timed()
+def write_highest_scores_sheet(ws: Worksheet, tables: dict[str, pd.DataFrame]) -> None:
+    """Write Highest Scores + Passes sheet"""
+    write_table(tables["scores_singles"], ws["A3"])
+    write_table(tables["passes_singles"], ws["J3"])
+
+    write_table(tables["scores_doubles"], ws["A106"])
+    write_table(tables["passes_doubles"], ws["J106"])
+
+
+# sheet name in the template -> (compute step, write step)
+SHEETS: dict[str, tuple[Callable[[TableStats], dict[str, pd.DataFrame]], Callable[[Worksheet, dict], None]]] = {
+    "General": (compute_general_sheet, write_general_sheet),
+    "Most Played Charts": (compute_most_played_charts_sheet, write_most_played_charts_sheet),
+    "Most Played Songs": (compute_most_played_songs_sheet, write_most_played_songs_sheet),
+    "Most Played Packs": (compute_most_played_packs_sheet, write_most_played_packs_sheet),
+    "Recently Played Packs": (compute_recently_played_packs_sheet, write_recently_played_packs_sheet),
+    "Pack Completion": (compute_pack_completion_sheet, write_pack_completion_sheet),
+    "Highest Scores + Passes": (compute_highest_scores_sheet, write_highest_scores_sheet),
+}
+
+
+# Single step versions, for when the sheets don't need to be computed concurrently (e.g. from the notebook)
+
+
+def create_general_sheet(ws: Worksheet, stats: TableStats, mode_labels: Optional[dict[str, str]] = None) -> None:
+    """Create General sheet"""
+    write_general_sheet(ws, compute_general_sheet(stats, mode_labels))
+
+
+def create_most_played_charts_sheet(ws: Worksheet, stats: TableStats, limit: int = 50) -> None:
+    """Create Most Played Charts sheet"""
+    write_most_played_charts_sheet(ws, compute_most_played_charts_sheet(stats, limit))
+
+
+def create_most_played_songs_sheet(ws: Worksheet, stats: TableStats, limit: int = 50) -> None:
+    """Create Most Played Songs sheet"""
+    write_most_played_songs_sheet(ws, compute_most_played_songs_sheet(stats, limit))
+
+
 def create_most_played_packs_sheet(ws: Worksheet, stats: TableStats) -> None:
     """Create Most Played Packs sheet"""
-    packs_by_playcount = analyzers.most_played_packs(stats)
-    song_breakdown = analyzers.most_played_charts_per_pack(stats)
-
-    final_table = packs_by_playcount.join(song_breakdown)
-    write_table(final_table.reset_index(), ws["A2"])
+    write_most_played_packs_sheet(ws, compute_most_played_packs_sheet(stats))
 
 
 def create_recently_played_packs_sheet(ws: Worksheet, stats: TableStats) -> None:
     """Create Recently Played Packs sheet"""
-    packs = analyzers.recently_played_packs(stats)
-    write_table(packs.reset_index(), ws["A2"])
+    write_recently_played_packs_sheet(ws, compute_recently_played_packs_sheet(stats))
 
 
 def create_pack_completion_sheet(ws: Worksheet, stats: TableStats) -> None:
     """Create Pack Completion sheet"""
-    completion = analyzers.pack_completion(stats)
-
-    # note: column labels for grade boundaries aren't written out in code,
-    # they're hardcoded in the Excel sheet so user has maximal control over formatting.
-    # if grade boundaries are changed the excel sheet has to be modified as well
-    grade_breakdown = analyzers.pack_score_breakdown(stats, analyzers.GRADE_BY_10)
-
-    table = completion.join(grade_breakdown)
-    write_table(table.reset_index(), ws["A3"])
+    write_pack_completion_sheet(ws, compute_pack_completion_sheet(stats))
 
 
 def create_highest_scores_sheet(ws: Worksheet, stats: TableStats) -> None:
     """Create Highest Scores + Passes sheet"""
-    # ideas for other ways to split it
-    #   - top 5 for each block difficulty
-    #   - highest scores (DDR only)
-    # there are too many ways to slice the highscore data --
-    # I think the only way to make it useful is to make it interactive
-    highest_scores_singles = analyzers.highest_scores(stats, with_ddr=False, modes=["dance-single"])
-    highest_passes_singles = analyzers.highest_passes(stats, with_ddr=False, modes=["dance-single"])
-
-    write_table(highest_scores_singles, ws["A3"])
-    write_table(highest_passes_singles, ws["J3"])
-
-    highest_scores_doubles = analyzers.highest_scores(stats, with_ddr=False, modes=["dance-double"])
-    highest_passes_doubles = analyzers.highest_passes(stats, with_ddr=False, modes=["dance-double"])
-
-    write_table(highest_scores_doubles, ws["A106"])
-    write_table(highest_passes_doubles, ws["J106"])
+    write_highest_scores_sheet(ws, compute_highest_scores_sheet(stats))
@@ -1,12 +1,232 @@
-from typing import Optional
+from collections.abc import Iterable
+from typing import Literal, Optional
 
 import numpy as np
 import pandas as pd
 
 import constants
+import upload_data
+from profiling import timed
 from table_stats import TableStats
 
+# ---------------------------------------------
+#   Pack aggregation cubes
+#   Pack-level analyzers all count/sum the same few things per pack, with different filters.
+#   Instead of each doing its own groupby over every chart, these are aggregated once
+#   (memoized on the stats object) and the analyzers slice them.
+# ---------------------------------------------
 
+
+@timed()
+def pack_chart_cube(stats: TableStats) -> pd.DataFrame:
+    """
+    Chart measures for every pack except @mem, aggregated in a single pass.
+    (pack, steptype, meter, available, played) -> (charts, playcount, lastplayed)
+        - available: chart is in the song listing
+        - played: playcount > 0
+        - charts: number of charts
+        - playcount: sum of playcounts
+        - lastplayed: most recent play (NaT if never played)
+
+    The dimensions are plain columns, rows are in order of first appearance in `stats.combined`.
+    meter is kept as is (NaN for charts missing from the song listing), analyzers bucket it themselves.
+    """
+
+    def compute() -> pd.DataFrame:
+        combined = stats.combined
+        flags = stats.chart_flags
+        index = combined.index
+        keep = ~flags["is_mem"].to_numpy()
+        steptype = index.names.index("steptype")
+        charts = pd.DataFrame(
+            {
+                "pack": combined["pack"].to_numpy()[keep],
+                "steptype": pd.Categorical.from_codes(index.codes[steptype], index.levels[steptype])[keep],
+                "meter": combined["meter"].to_numpy()[keep],
+                "available": flags["is_available"].to_numpy()[keep],
+                "played": combined["playcount"].to_numpy()[keep] > 0,
+                "playcount": combined["playcount"].to_numpy()[keep],
+                "lastplayed": combined["lastplayed"].to_numpy()[keep],
+            }
+        )
+        cube = charts.groupby(
+            ["pack", "steptype", "meter", "available", "played"], sort=False, observed=True, dropna=False
+        ).agg(charts=("playcount", "size"), playcount=("playcount", "sum"), lastplayed=("lastplayed", "max"))
+        return cube.reset_index()
+
+    return stats.memoize(("pack_chart_cube",), compute)
+
+
+def steptype_bits(stats: TableStats, steptypes: Iterable[str]) -> int:
+    """Bitmask for the given steptypes, to test against the `steptypes` column of pack_song_cube()."""
+    level = stats.combined.index.levels[stats.combined.index.names.index("steptype")]
+    return sum(1 << i for i, steptype in enumerate(level) if steptype in set(steptypes))
+
+
+@timed()
+def pack_song_cube(stats: TableStats) -> pd.DataFrame:
+    """
+    Song measures for every pack except @mem, counting only charts in the song listing.
+    (pack, steptypes, played) -> (songs)
+        - steptypes: bitmask of the steptypes the song has charts for, see steptype_bits()
+        - played: any of the song's charts has been played
+        - songs: number of songs
+    """
+
+    def compute() -> pd.DataFrame:
+        combined = stats.combined
+        flags = stats.chart_flags
+        index = combined.index
+        keep = (flags["is_available"] & ~flags["is_mem"]).to_numpy()
+        key = index.names.index("key")
+        steptype = index.names.index("steptype")
+        if len(index.levels[steptype]) > 64:
+            raise ValueError("too many steptypes to fit in a bitmask")
+        charts = pd.DataFrame(
+            {
+                "key": index.codes[key][keep],
+                "pack": combined["pack"].to_numpy()[keep],
+                "bit": np.left_shift(np.uint64(1), index.codes[steptype][keep].astype(np.uint64)),
+                "played": combined["playcount"].to_numpy()[keep] > 0,
+            }
+        )
+        # OR together each song's steptype bits, by summing the distinct ones
+        songs = (
+            charts.drop_duplicates(["key", "bit"])
+            .groupby("key", sort=False)
+            .agg(pack=("pack", "first"), steptypes=("bit", "sum"))
+        )
+        songs["played"] = charts.groupby("key", sort=False)["played"].any()
+        cube = songs.groupby(["pack", "steptypes", "played"], sort=False, observed=True).size().rename("songs")
+        return cube.reset_index()
+
+    return stats.memoize(("pack_song_cube",), compute)
+
+
+# ---------------------------------------------
+#   Play history rollups
+#   Per-play data from the upload folder goes back years, so the play history analyzers don't go through
+#   the plays themselves: they use the daily playcount of every chart (`stats.dailyplays`, kept up to date
+#   by the upload loader), rolled up further to packs and weeks/months. The rollups are sorted by day,
+#   so a time window is found by binary search and only the days in it are looked at.
+# ---------------------------------------------
+
+
+def _require_uploads(stats: TableStats) -> None:
+    if stats.uploaddata is None:
+        raise ValueError("play history needs the upload folder loaded, see upload_data.fill_upload_data()")
+
+
+def _window(
+    df: pd.DataFrame, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp], column: str = "day"
+) -> pd.DataFrame:
+    """Rows of a table sorted by `column` with start <= column <= end (either can be None for no limit)"""
+    day = df[column].to_numpy()
+    lo = 0 if start is None else np.searchsorted(day, np.datetime64(start), side="left")
+    hi = len(day) if end is None else np.searchsorted(day, np.datetime64(end), side="right")
+    return df.iloc[lo:hi]
+
+
+@timed()
+def daily_plays(stats: TableStats) -> pd.DataFrame:
+    """
+    Daily playcount of every chart.
+    (index) -> (day, key, steptype, difficulty, plays), in order of day
+
+    This is `stats.dailyplays` if the upload loader filled it in, otherwise it's rolled up from `stats.uploaddata`.
+    """
+    _require_uploads(stats)
+    if stats.dailyplays is not None:
+        return stats.dailyplays
+    return stats.memoize(("daily_plays",), lambda: upload_data.daily_playcounts(stats.uploaddata))
+
+
+@timed()
+def pack_daily_plays(stats: TableStats) -> pd.DataFrame:
+    """
+    Daily playcount of every pack (including @mem).
+    (index) -> (day, pack, plays), in order of day
+    """
+
+    def compute() -> pd.DataFrame:
+        daily = daily_plays(stats)
+        key = daily["key"].cat
+        # only the distinct keys need splitting into packs
+        pack_codes, packs = pd.factorize(key.categories.str.split("/").str[0], sort=True)
+        pack = pd.Categorical.from_codes(pack_codes[key.codes], packs)
+        return daily.assign(pack=pack).groupby(["day", "pack"], observed=True)["plays"].sum().reset_index()
+
+    return stats.memoize(("pack_daily_plays",), compute)
+
+
+@timed()
+def period_plays(
+    stats: TableStats, freq: Literal["D", "W", "M"] = "W", by: Literal["pack", "chart"] = "pack"
+) -> pd.DataFrame:
+    """
+    Playcounts per day, week or month (freq "D", "W" or "M") of every pack (by="pack") or chart (by="chart").
+    (index) -> (period, pack, plays) or (period, key, steptype, difficulty, plays), in order of period
+        - period: first day of the period, weeks start on Monday
+    """
+    groups = {"pack": ["pack"], "chart": ["key", "steptype", "difficulty"]}[by]
+
+    def compute() -> pd.DataFrame:
+        daily = pack_daily_plays(stats) if by == "pack" else daily_plays(stats)
+        # work out the period of each distinct day only
+        day_codes, days = pd.factorize(daily["day"])
+        period = days.to_period(freq).start_time.take(day_codes)
+        return daily.assign(period=period).groupby(["period", *groups], observed=True)["plays"].sum().reset_index()
+
+    return stats.memoize(("period_plays", freq, by), compute)
+
+
+# ---------------------------------------------
+#   Top N selection
+#   The "highest" analyzers only show the first few rows of a long table. Rather than sorting all of it
+#   (and joining names onto every row first), the rows that can make the cut are picked out by partial selection
+#   on the first sort column, and only those are sorted and given names.
+#   (most_played_charts and most_played_songs keep their full sort: it isn't stable, so which of several rows with
+#   the same playcount come first depends on the whole table, and the report shouldn't change.)
+# ---------------------------------------------
+
+
+def _top_rows(df: pd.DataFrame, limit: int, by: list[str], ties_by_chart: bool = False) -> pd.DataFrame:
+    """
+    Return the first `limit` rows of `df` sorted by the `by` columns, descending, ties in table order.
+    The same as `df.sort_values(by, ascending=False, kind="stable").head(limit)`, but only the rows
+    at or above the limit-th largest value of the first column get sorted.
+
+    ties_by_chart - ties in order of chart (the index) instead, then table order. That's the order a join
+    leaves rows in when the index has repeated charts, as in leaderboards.
+    """
+    values = df[by[0]].to_numpy(dtype=float)
+    known = values[~np.isnan(values)]
+    if len(known) > limit > 0:
+        # every row that makes it has at least the limit-th largest value, ties at it are sorted out below
+        threshold = np.partition(known, len(known) - limit)[len(known) - limit]
+        df = df[values >= threshold]
+    if ties_by_chart:
+        df = df.iloc[np.argsort(df.index.to_numpy(), kind="stable")]
+    return df.sort_values(by, ascending=False, kind="stable").head(limit)
+
+
+def _with_chart_data(stats: TableStats, df: pd.DataFrame, song_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the `song_data` columns and stepfull of each row's chart to a table indexed by chart, like
+    `df.join(song_data).join(stats.song_shorthand["stepfull"])`. Looked up row by row: joins factorize
+    every chart of the lookup table when `df` has repeated charts, this only costs as much as `df` is long.
+    """
+    charts = song_data.reindex(df.index)
+    stepfull = stats.song_shorthand["stepfull"].reindex(df.index)
+    return df.assign(**{column: charts[column].array for column in charts}, stepfull=stepfull.array)
+
+
+# ---------------------------------------------
+#   Analyzers
+# ---------------------------------------------
+
+
+@timed()
 def chart_counts_for_each_pack(stats: TableStats, modes: dict[str, str]) -> pd.DataFrame:
     """
     Generate number of charts and songs per pack, in total, and filtered to each given mode.
@@ -16,31 +236,33 @@ def chart_counts_for_each_pack(stats: TableStats, modes: dict[str, str]) -> pd.D
     The name of the two columns for each mode will be `{column_label}_charts` and `{column_label}_songs`.
         e.g. modes = {"dance-single": "single"} -> "single_charts" and "single_songs"
     """
-    data = stats.song_data(with_mem=False, keep_unavailable=False)
-
-    def one_row_per_song(df: pd.DataFrame) -> pd.DataFrame:
-        return df[~df.index.get_level_values("key").duplicated()]
+    charts = pack_chart_cube(stats)
+    charts = charts[charts.available]
+    songs = pack_song_cube(stats)
 
-    def songs_and_charts(v: pd.DataFrame, column_prefix: str = "") -> tuple[pd.Series, pd.Series]:
-        """Count number of songs and number of charts in each pack"""
+    def songs_and_charts(steptypes: list[str], column_prefix: str = "") -> tuple[pd.Series, pd.Series]:
+        """Count number of songs and number of charts with the given steptypes in each pack"""
         if column_prefix != "":
             column_prefix = f"{column_prefix}_"
-        total_charts = v.groupby("pack").size().rename(f"{column_prefix}charts")
-        total_songs = one_row_per_song(v).groupby("pack").size().rename(f"{column_prefix}songs")
+        v = charts[charts.steptype.isin(steptypes)]
+        total_charts = v.groupby("pack", observed=True)["charts"].sum().rename(f"{column_prefix}charts")
+        v = songs[(songs.steptypes & steptype_bits(stats, steptypes)) != 0]
+        total_songs = v.groupby("pack", observed=True)["songs"].sum().rename(f"{column_prefix}songs")
         return total_songs, total_charts
 
     # note: there might be other chart types, like pump-single, pump-double, or weird ones like lights-cabinet
     # to avoid counting unplayable stuff, we'll filter "total charts" to only the requested modes
-    total = songs_and_charts(data.loc[pd.IndexSlice[:, list(modes.keys()), :]])
+    total = songs_and_charts(list(modes.keys()))
     per_steptype = []
     for steptype, label in modes.items():
-        columns = songs_and_charts(data.loc[pd.IndexSlice[:, [steptype], :]], label)
+        columns = songs_and_charts([steptype], label)
         per_steptype.extend(columns)
 
     v = pd.concat([*total, *per_steptype], axis=1).fillna(0).sort_index(key=constants.pack_name_sorter)
     return v
 
 
+@timed()
 def pack_difficulty_histogram(stats: TableStats, upper_limit: int = 27) -> pd.DataFrame:
     """
     Histogram of chart block difficulties in each pack, normalized between 0 and 1.
@@ -54,20 +276,22 @@ def pack_difficulty_histogram(stats: TableStats, upper_limit: int = 27) -> pd.Da
     The side effect of this is to deal with joke difficulties, 69, 420, 31337, etc.
     ? column is for any charts which don't have meter data in the table (unfilled song data).
     """
-    data = stats.song_data(with_mem=False, keep_unavailable=False)
-    invalid = data[pd.isnull(data.meter) | (data.meter == 0)]
-    valid = data[~data.index.isin(invalid.index)]
+    data = pack_chart_cube(stats)
+    data = data[data.available]
+    is_invalid = pd.isnull(data.meter) | (data.meter == 0)
+    invalid = data[is_invalid]
+    valid = data[~is_invalid]
 
     # maybe there's a way to do this without stacking and unstacking so much, idk
     normal = (
         valid[valid.meter < upper_limit]
-        .groupby(["pack", "meter"])
-        .size()
+        .groupby(["pack", "meter"], observed=True)["charts"]
+        .sum()
         .unstack()
         .rename(columns=lambda s: str(int(s)))
     )
-    above = valid[valid.meter >= upper_limit].groupby(["pack"]).size().rename(f"{upper_limit}+")
-    unknown = invalid.groupby(["pack"]).size().rename("?")
+    above = valid[valid.meter >= upper_limit].groupby(["pack"], observed=True)["charts"].sum().rename(f"{upper_limit}+")
+    unknown = invalid.groupby(["pack"], observed=True)["charts"].sum().rename("?")
 
     # normalize
     total = pd.concat([normal, above, unknown], axis=1)
@@ -75,6 +299,7 @@ def pack_difficulty_histogram(stats: TableStats, upper_limit: int = 27) -> pd.Da
     return histogram
 
 
+@timed()
 def most_played_charts(stats: TableStats, limit: int = 50, modes: Optional[list] = None) -> pd.DataFrame:
     """
     (pack, song, stepfull, difficulty, meter, playcount, last played) ordered by playcount descending
@@ -92,6 +317,7 @@ def most_played_charts(stats: TableStats, limit: int = 50, modes: Optional[list]
     return a
 
 
+@timed()
 def most_played_songs(stats: TableStats, limit: int = 50, modes: Optional[list] = None) -> pd.DataFrame:
     """
     (pack, song, playcount, last played, ...difficulty spread for each mode) sorted by playcount descending
@@ -144,18 +370,22 @@ def most_played_songs(stats: TableStats, limit: int = 50, modes: Optional[list]
     return playcount_breakdown
 
 
+@timed()
 def most_played_packs(stats: TableStats) -> pd.DataFrame:
     """
     Return the packs with the highest playcount across all songs in the pack
     (pack) -> (playcount, lastplayed) sorted by playcount descending
     """
-    v = stats.song_data(with_mem=False, keep_unavailable=True)
+    v = pack_chart_cube(stats)
     most_played_packs = (
-        v.groupby("pack").agg({"playcount": "sum", "lastplayed": "max"}).sort_values(by="playcount", ascending=False)
+        v.groupby("pack", observed=True)
+        .agg({"playcount": "sum", "lastplayed": "max"})
+        .sort_values(by="playcount", ascending=False)
     )
     return most_played_packs
 
 
+@timed()
 def most_played_charts_per_pack(stats: TableStats, N: int = 10) -> pd.DataFrame:
     """
     Return the N most played charts in each pack
@@ -171,7 +401,7 @@ def most_played_charts_per_pack(stats: TableStats, N: int = 10) -> pd.DataFrame:
     v = v[v.playcount > 0]
 
     # give each chart a place within its pack and only keep top N
-    place = v.sort_values("playcount", ascending=False).groupby("pack").cumcount() + 1
+    place = v.sort_values("playcount", ascending=False).groupby("pack", observed=True).cumcount() + 1
     x = v.assign(place=place)
     x = x[x.place <= N]
 
@@ -189,21 +419,101 @@ def most_played_charts_per_pack(stats: TableStats, N: int = 10) -> pd.DataFrame:
     return x
 
 
+@timed()
 def recently_played_packs(stats: TableStats) -> pd.DataFrame:
     """
     Return packs sorted by when any song within them was last played, from most to least recent.
     (pack, last played) sorted by last played descending
     """
+    v = pack_chart_cube(stats)
     last_played_packs = (
-        # set keep_unavailable=False, don't want to display any packs which have been removed
-        stats.song_data(with_mem=False, keep_unavailable=False)
-        .groupby("pack")
+        # only available charts, don't want to display any packs which have been removed
+        v[v.available]
+        .groupby("pack", observed=True)
         .agg({"lastplayed": "max"})
         .sort_values(by="lastplayed", ascending=False)
     )
     return last_played_packs
 
 
+@timed()
+def plays_per_period(
+    stats: TableStats,
+    freq: Literal["D", "W", "M"] = "W",
+    by: Literal["pack", "chart"] = "pack",
+    start: Optional[pd.Timestamp] = None,
+    end: Optional[pd.Timestamp] = None,
+) -> pd.DataFrame:
+    """
+    Playcount of every pack or chart in each day, week or month, from the upload folder.
+    (period, pack) -> (plays) or (period, key, steptype, difficulty) -> (plays), in order of period
+
+    freq - "D", "W" or "M" (weeks start on Monday, each period is labelled with its first day)
+    by - "pack" or "chart"
+    start, end - only the periods starting between these days (inclusive)
+    """
+    _require_uploads(stats)
+    v = _window(period_plays(stats, freq, by), start, end, column="period")
+    return v.set_index(list(v.columns[:-1]))
+
+
+@timed()
+def hot_packs(stats: TableStats, days: int = 30, end: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """
+    Return the packs played the most in the last `days` days, from the upload folder.
+    (pack) -> (plays, days played, last played) sorted by plays descending
+
+    end - last day of the window, by default the day of the most recent play
+    Like recently_played_packs, USB customs (@mem) aren't counted.
+    """
+    _require_uploads(stats)
+    v = pack_daily_plays(stats)
+    if end is None:
+        end = v["day"].iloc[-1] if len(v) else pd.Timestamp.now()
+    end = pd.Timestamp(end).normalize()
+    v = _window(v, end - pd.Timedelta(days=days - 1), end)
+    v = v[(v.pack != "@mem").to_numpy()]
+    hot_packs = (
+        v.groupby("pack", observed=True)
+        .agg(plays=("plays", "sum"), days=("day", "size"), lastplayed=("day", "max"))
+        .sort_values(by=["plays", "lastplayed"], ascending=False)
+    )
+    return hot_packs
+
+
+@timed()
+def play_sessions(stats: TableStats, gap_minutes: float = 30, since: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """
+    Split the plays from the upload folder into sessions: runs of plays with no more than `gap_minutes` between them.
+    (session number) -> (start, end, plays, players, songs) in order of time
+        - start, end: times of the first and last play (StepMania records the time a stage ends)
+        - players: number of different players
+
+    since - only look at plays from this time on
+    """
+    _require_uploads(stats)
+    v = stats.uploaddata
+    timestamps = v["timestamp"].to_numpy()
+    if since is not None:
+        # plays are in order of time
+        first = np.searchsorted(timestamps, np.datetime64(pd.Timestamp(since)), side="left")
+        v = v.iloc[first:]
+        timestamps = timestamps[first:]
+
+    new_session = np.diff(timestamps, prepend=timestamps[:1]) > np.timedelta64(pd.Timedelta(minutes=gap_minutes))
+    session = np.cumsum(new_session) + 1
+    sessions = v.groupby(session).agg(
+        start=("timestamp", "min"),
+        end=("timestamp", "max"),
+        plays=("timestamp", "size"),
+        players=("player", "nunique"),
+        songs=("key", "nunique"),
+    )
+    sessions.index.name = "session"
+    return sessions
+
+
+@timed()
 def pack_completion(stats: TableStats) -> pd.DataFrame:
     """
     Count number of songs/charts played in each pack and the ratio of played songs/charts.
@@ -211,18 +521,16 @@ def pack_completion(stats: TableStats) -> pd.DataFrame:
     (pack) -> (played songs, total songs, ratio songs, played charts, total charts, ratio charts)
     sorted by (ratio_songs, total_songs) descending
     """
+    v = pack_chart_cube(stats)
+    v = v[v.available]
+    v_played = v[v.played]
+    songs = pack_song_cube(stats)
 
-    def one_row_per_song(song_data: pd.DataFrame) -> pd.DataFrame:
-        return song_data[~song_data.index.get_level_values("key").duplicated()]
-
-    v = stats.song_data(with_mem=False, keep_unavailable=False)
-    v_played = v[v.playcount > 0]
-
-    played_charts = v_played.groupby("pack").size()
-    total_charts = v.groupby("pack").size()
+    played_charts = v_played.groupby("pack", observed=True)["charts"].sum()
+    total_charts = v.groupby("pack", observed=True)["charts"].sum()
 
-    played_songs = one_row_per_song(v_played).groupby("pack").size()
-    total_songs = one_row_per_song(v).groupby("pack").size()
+    played_songs = songs[songs.played].groupby("pack", observed=True)["songs"].sum()
+    total_songs = songs.groupby("pack", observed=True)["songs"].sum()
 
     percentage_played = (
         pd.DataFrame(index=total_charts.index)
@@ -273,6 +581,7 @@ GRADE_SIMPLY_LOVE = {
 }
 
 
+@timed()
 def pack_score_breakdown(stats: TableStats, grade_boundaries: Optional[dict[float, str]] = None) -> pd.DataFrame:
     """
     Count the number of quads, tri-stars, double stars, fails, etc. achieved in each pack
@@ -302,19 +611,24 @@ def pack_score_breakdown(stats: TableStats, grade_boundaries: Optional[dict[floa
     top_grades_per_chart = pd.cut(top_scores_per_chart["score"], values, labels=labels, right=False).rename("grade")
 
     # count grades
-    grade_count_per_pack = top_grades_per_chart.to_frame().join(stats.pack_info).groupby(["pack", "grade"]).size()
+    # (observed=False keeps a column for every grade, even ones nobody got. the extra rows this makes
+    # for packs that were filtered out are dropped by the reindexing below)
+    grade_count_per_pack = (
+        top_grades_per_chart.to_frame().join(stats.pack_info).groupby(["pack", "grade"], observed=False).size()
+    )
 
     # calculate failed charts
     # grab pack list for reindexing
-    v = stats.song_data(with_mem=False, keep_unavailable=False)
+    v = pack_chart_cube(stats)
+    v = v[v.available]
     pack_list = v["pack"].unique()
 
     # first get count of played charts (reindexed to pack list)
     # second get count of chart scores (reindexed to pack list)
     # subtract first - second to get number of failed scores per pack
-    v_played = v[v.playcount > 0]
-    played_charts = v_played.groupby("pack").size().reindex(index=pack_list, fill_value=0)
-    scored_charts = grade_count_per_pack.groupby("pack").sum().reindex(index=pack_list, fill_value=0)
+    v_played = v[v.played]
+    played_charts = v_played.groupby("pack", observed=True)["charts"].sum().reindex(index=pack_list, fill_value=0)
+    scored_charts = grade_count_per_pack.groupby("pack", observed=True).sum().reindex(index=pack_list, fill_value=0)
     failed_charts = played_charts - scored_charts
 
     # smash grade counts into a table format (reindexed to pack list) and add the failed scores column
@@ -324,6 +638,7 @@ def pack_score_breakdown(stats: TableStats, grade_boundaries: Optional[dict[floa
     return output
 
 
+@timed()
 def song_grades_by_meter(
     stats: TableStats, grade_boundaries: Optional[dict[float, str]] = None, upper_limit: int = 27
 ) -> pd.DataFrame:
@@ -365,6 +680,7 @@ def song_grades_by_meter(
     return x.unstack()
 
 
+@timed()
 def highest_scores(stats: TableStats, with_ddr: bool, limit: int = 100, modes: Optional[list] = None) -> pd.DataFrame:
     """
     Return top N highest scores. Ties are sorted by meter descending.
@@ -379,16 +695,18 @@ def highest_scores(stats: TableStats, with_ddr: bool, limit: int = 100, modes: O
     if modes:
         leaderboards = leaderboards.loc[pd.IndexSlice[:, modes, :]]
 
-    leaderboards = (
-        leaderboards.join(stats.song_data(with_mem=False, keep_unavailable=False))
-        .join(stats.song_shorthand["stepfull"])
-        .sort_values(by=["score", "meter"], ascending=False)
-    )
-    return leaderboards.head(limit).reset_index()[
+    song_data = stats.song_data(with_mem=False, keep_unavailable=False)
+    # just the meter to break ties with, names are only joined onto the scores that make it
+    meter = song_data["meter"].reindex(leaderboards.index).to_numpy()
+    scores = leaderboards.assign(meter=meter)
+    top = _top_rows(scores, limit, ["score", "meter"], ties_by_chart=True).drop(columns="meter")
+
+    return _with_chart_data(stats, top, song_data).reset_index()[
         ["pack", "song", "stepfull", "difficulty", "meter", "player", "score", "timestamp"]
     ]
 
 
+@timed()
 def highest_passes(
     stats: TableStats, with_ddr: bool, max_diff: int = 27, limit: int = 100, modes: Optional[list] = None
 ) -> pd.DataFrame:
@@ -406,12 +724,12 @@ def highest_passes(
     if modes:
         leaderboards = leaderboards.loc[pd.IndexSlice[:, modes, :]]
 
-    leaderboards = (
-        leaderboards.join(stats.song_data(with_mem=False, keep_unavailable=False))
-        .join(stats.song_shorthand["stepfull"])
-        .sort_values(by=["meter", "score"], ascending=False)
-    )
-    leaderboards = leaderboards[leaderboards.meter <= max_diff]
-    return leaderboards.head(limit).reset_index()[
+    song_data = stats.song_data(with_mem=False, keep_unavailable=False)
+    # just the meter to pick the passes by, names are only joined onto the ones that make it
+    meter = song_data["meter"].reindex(leaderboards.index).to_numpy()
+    passes = leaderboards.assign(meter=meter)[meter <= max_diff]
+    top = _top_rows(passes, limit, ["meter", "score"], ties_by_chart=True).drop(columns="meter")
+
+    return _with_chart_data(stats, top, song_data).reset_index()[
         ["pack", "song", "stepfull", "difficulty", "meter", "player", "score", "timestamp"]
     ]
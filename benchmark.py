@@ -0,0 +1,567 @@
+# Micro-benchmarks for the slow parts of the pipeline, run on generated data
+# so they don't need a real cab's files.
+# usage: benchmark.py (benchmark name) [options], see --help
+
+import argparse
+import csv
+import gc
+import inspect
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from synthetic import (
+    add_config_arguments,
+    config_from_arguments,
+    write_cab,
+    write_synthetic_listing,
+    write_synthetic_pack,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from openpyxl.cell import Cell
+    from openpyxl.worksheet.worksheet import Worksheet
+
+
+def best_of(fn: Callable[[], object], repeat: int = 3, setup: Optional[Callable[[], object]] = None) -> float:
+    """
+    Run fn() `repeat` times and return the fastest wall time in seconds.
+    setup: Called (untimed) before every run, e.g. to clear caches.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def report(results: dict[str, float], baseline: str) -> None:
+    """Print timings relative to the baseline entry."""
+    for name, seconds in results.items():
+        print(f"{name:>24}: {seconds * 1000:10.1f} ms  ({results[baseline] / seconds:5.1f}x)")
+
+
+# ---------------------------------------------
+#   Reference implementations
+#   (previous versions of optimized code, kept to check the new versions give identical results)
+# ---------------------------------------------
+
+
+def legacy_fill_song_listing(path_to_csv: Path, packs_to_ignore: set[str]) -> "pd.DataFrame":
+    """TableStats.fill_song_listing before it was vectorized: row by row in Python."""
+    from collections import Counter
+
+    import pandas as pd
+
+    with open(path_to_csv, newline="", encoding="utf8") as csvfile:
+        availablesongs = list(csv.reader(csvfile, delimiter=",", quotechar='"'))
+
+    data = []
+    encountered = Counter()
+    for row in availablesongs:
+        pack, songname = row[0].strip("/").split("/")
+        if pack in packs_to_ignore:
+            continue
+        key = (row[0], row[2], row[3])
+        if key in encountered:
+            row[3] = f"{row[3]}-{encountered[key]}"
+        row[4] = int(row[4])
+        encountered[key] += 1
+        data.append(row)
+
+    df_availablesongs = pd.DataFrame(data, columns=["key", "song", "steptype", "difficulty", "meter"])
+    return df_availablesongs.set_index(["key", "steptype", "difficulty"])
+
+
+def legacy_song_shorthand(combined: "pd.DataFrame") -> "pd.DataFrame":
+    """TableStats.song_shorthand before it was vectorized: a Python function applied to every row."""
+    import pandas as pd
+
+    import constants
+
+    def shorthand(row) -> tuple:  # noqa: ANN001
+        steptype = row.name[1]
+        diff = row.name[2].partition("-")[0]
+        s = t.single_letter if (t := constants.modes.get(steptype)) else steptype
+        d = t.single_letter if (t := constants.diffs.get(diff)) else diff
+        sfull = t.full_name if (t := constants.modes.get(steptype)) else steptype
+        meter = "" if pd.isna(row.meter) else int(row.meter)
+        dtag = f"{s}{d}{meter}"
+        return (f"{row.song} {dtag}", dtag, sfull)
+
+    song_shorthand = combined.apply(shorthand, axis=1, result_type="expand")
+    return song_shorthand.rename(columns=dict(enumerate(["shorthand", "dtag", "stepfull"])))
+
+
+def legacy_write_table(df: "pd.DataFrame", cell: "Cell", index: bool = False, header: bool = False) -> None:
+    """analysis.write_table before the bulk writer: one ws.cell() lookup per value."""
+    from openpyxl.utils.dataframe import dataframe_to_rows
+
+    for dr, row in enumerate(dataframe_to_rows(df, index=index, header=header)):
+        for dc, value in enumerate(row):
+            cell.offset(dr, dc).value = value
+
+
+# ---------------------------------------------
+#   Benchmarks
+# ---------------------------------------------
+
+
+def bench_simfile_parse(args: argparse.Namespace) -> None:
+    """Header-only simfile reader vs simfile.load, scanning a synthetic pack."""
+    from getavailablesongs import scan_simfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pack = Path(tmp) / "Pack"
+        write_synthetic_pack(pack, songs=args.songs, measures=args.measures)
+        smpaths = sorted(p for p in pack.rglob("*") if p.suffix in (".sm", ".ssc"))
+
+        full = [scan_simfile(p, fast=False) for p in smpaths]
+        fast = [scan_simfile(p, fast=True) for p in smpaths]
+        assert full == fast, "header-only reader disagrees with simfile.load"
+
+        print(f"{len(smpaths)} simfiles, {sum(p.stat().st_size for p in smpaths) / 2**20:.1f} MB")
+        report(
+            {
+                "simfile.load": best_of(lambda: [scan_simfile(p, fast=False) for p in smpaths], args.repeat),
+                "read_simfile_header": best_of(lambda: [scan_simfile(p, fast=True) for p in smpaths], args.repeat),
+            },
+            baseline="simfile.load",
+        )
+
+
+def bench_song_listing(args: argparse.Namespace) -> None:
+    """Vectorized TableStats.fill_song_listing vs the old row-by-row loader, on a generated listing."""
+    import pandas as pd
+
+    import song_listing
+    from table_stats import TableStats
+
+    def load(path: Path) -> pd.DataFrame:
+        stats = TableStats()
+        stats.fill_song_listing(path, packs_to_ignore)
+        return stats.availablesongs
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "song_listing.csv"
+        write_synthetic_listing(path, rows=args.rows)
+        packs_to_ignore = {"Pack 0001", "Pack 0100"}
+
+        # regression check: both loaders must produce exactly the same table
+        expected = legacy_fill_song_listing(path, packs_to_ignore)
+        pd.testing.assert_frame_equal(load(path), expected)
+
+        results = {
+            "row by row": best_of(lambda: legacy_fill_song_listing(path, packs_to_ignore), args.repeat),
+            "vectorized (csv)": best_of(lambda: load(path), args.repeat),
+        }
+        try:
+            for fmt in ("parquet", "feather"):
+                columnar_path = path.with_suffix(song_listing.suffix_for(fmt))
+                song_listing.convert_csv(path, columnar_path, fmt)
+                pd.testing.assert_frame_equal(load(columnar_path), expected)
+                results[f"vectorized ({fmt})"] = best_of(lambda p=columnar_path: load(p), args.repeat)
+        except ImportError:
+            print("pyarrow not installed, skipping parquet/feather")
+
+        print(f"{len(expected)} charts, identical output")
+        report(results, baseline="row by row")
+
+
+def bench_song_shorthand(args: argparse.Namespace) -> None:
+    """Vectorized TableStats.song_shorthand vs the old row-wise apply, on a generated listing."""
+    import numpy as np
+    import pandas as pd
+
+    from table_stats import TableStats
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "song_listing.csv"
+        write_synthetic_listing(path, rows=args.rows)
+        stats = TableStats()
+        stats.fill_song_listing(path)
+
+    # play a third of the charts, plus some charts that aren't in the listing (so they have no meter)
+    rng = np.random.default_rng(0)
+    played = stats.availablesongs.sample(frac=1 / 3, random_state=0).index
+    removed = pd.MultiIndex.from_tuples(
+        [(f"Removed Pack/Song {i}/", "dance-single", diff) for i in range(100) for diff in ("Hard", "Edit", "Edit-1")],
+        names=played.names,
+    )
+    index = played.append(removed)
+    stats.playedsongs = pd.DataFrame(
+        {"playcount": rng.integers(1, 100, len(index)), "lastplayed": pd.Timestamp("2023-01-01")}, index=index
+    )
+
+    def vectorized() -> pd.DataFrame:
+        stats.__dict__.pop("song_shorthand", None)  # reset cached property
+        return stats.song_shorthand
+
+    # regression check: both versions must produce exactly the same table
+    pd.testing.assert_frame_equal(vectorized(), legacy_song_shorthand(stats.combined))
+
+    print(f"{len(stats.combined)} charts, identical output")
+    report(
+        {
+            "row-wise apply": best_of(lambda: legacy_song_shorthand(stats.combined), args.repeat),
+            "vectorized": best_of(vectorized, args.repeat),
+        },
+        baseline="row-wise apply",
+    )
+
+
+def bench_write_table(args: argparse.Namespace) -> None:
+    """Bulk analysis.write_table vs the old cell-by-cell writer, writing a mixed-type table into a workbook."""
+    import numpy as np
+    import pandas as pd
+    from openpyxl import Workbook
+
+    from analysis import write_table
+
+    rng = np.random.default_rng(0)
+    n = args.table_rows
+    makers = [
+        lambda: rng.integers(0, 1000, n),
+        lambda: np.where(rng.random(n) < 0.2, np.nan, rng.random(n)),
+        lambda: rng.choice(["Pack A", "Pack B", "Song title", "(12) Song SX12"], n),
+        lambda: pd.Series(pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 10**6, n), unit="s")).where(
+            rng.random(n) < 0.8
+        ),
+    ]
+    df = pd.DataFrame({f"col{i}": makers[i % len(makers)]() for i in range(args.table_columns)})
+
+    def new_sheet() -> "Worksheet":
+        ws = Workbook().active
+        # pretend to be a template: pre-styled cells in the target area should keep their style
+        for row in ws.iter_rows(min_row=2, max_row=11, max_col=args.table_columns):
+            for cell in row:
+                cell.number_format = "0.00%"
+        return ws
+
+    def write(writer: Callable) -> "Worksheet":
+        ws = new_sheet()
+        writer(df, ws["A1"], header=True)
+        return ws
+
+    def time_writer(writer: Callable) -> float:
+        """Time only the write itself, on a fresh sheet, without garbage from earlier runs being collected midway"""
+        times = []
+        for _ in range(args.repeat):
+            ws = new_sheet()
+            gc.collect()
+            start = time.perf_counter()
+            writer(df, ws["A1"], header=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    # regression check: same cell values and types, except that missing values are now written as None
+    # (the old writer wrote NaN as an empty number and gave NaT cells a date format, overriding the template)
+    old, new = write(legacy_write_table), write(write_table)
+    for old_row, new_row in zip(old.iter_rows(), new.iter_rows()):
+        for a, b in zip(old_row, new_row):
+            if pd.isna(a.value):
+                assert b.value is None and b.data_type == "n", (a.coordinate, b.value)
+            else:
+                assert (a.value, a.data_type, a.number_format) == (b.value, b.data_type, b.number_format), a.coordinate
+    assert new["A2"].number_format == "0.00%"
+
+    print(f"{n}x{args.table_columns} table, identical output")
+    report(
+        {
+            "cell by cell": time_writer(legacy_write_table),
+            "bulk": time_writer(write_table),
+        },
+        baseline="cell by cell",
+    )
+
+
+# arguments for the analyzers that need some, the way the report calls them
+ANALYZER_ARGS = {
+    "chart_counts_for_each_pack": ({"dance-single": "Singles", "dance-double": "Doubles"},),
+    "steptype_bits": (["dance-single", "dance-double"],),
+    "highest_scores": (False,),
+    "highest_passes": (False,),
+}
+
+# analyzers that need the upload folder, only run if the generated cab has one
+UPLOAD_ANALYZERS = {"daily_plays", "pack_daily_plays", "period_plays", "plays_per_period", "hot_packs", "play_sessions"}
+
+
+def git_commit() -> Optional[str]:
+    """Commit the code being benchmarked is at (with a + if there are local changes), if it's a git checkout"""
+    here = Path(__file__).parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=here, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=here, capture_output=True, text=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+" if dirty.strip() else "")
+
+
+def compare(results: dict, old_results: dict) -> None:
+    """Print timings next to those from an earlier run of the suite."""
+    if old_results["config"] != results["config"]:
+        print("warning: the earlier run was on differently generated data, timings aren't comparable")
+    print(f"{'':>40}  {old_results['commit'] or 'before':>10}  {results['commit'] or 'now':>10}")
+    for name, seconds in results["seconds"].items():
+        old = old_results["seconds"].get(name)
+        if old is None:
+            print(f"{name:>40}: {'':>10}  {seconds * 1000:7.1f} ms")
+        else:
+            print(f"{name:>40}: {old * 1000:7.1f} ms  {seconds * 1000:7.1f} ms  ({old / seconds:5.2f}x)")
+
+
+def bench_watch_reload(args: argparse.Namespace) -> None:
+    """
+    ReportWatcher loading one changed Stats.xml of two again vs loading everything from scratch.
+    Also checks that when the other one fails to load at the same time, the derived tables don't go stale.
+    """
+    import itertools
+    import shutil
+    from dataclasses import replace
+
+    import pandas as pd
+
+    from table_stats import TableStats
+    from watch import ReportWatcher
+
+    config = config_from_arguments(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        write_cab(config, folder / "a")
+        write_cab(replace(config, seed=config.seed + 1), folder / "b")
+        write_cab(replace(config, seed=config.seed + 2, mean_plays=config.mean_plays * 2), folder / "a2")
+        listing = folder / "a" / "song_listing.csv"
+        sources = {"a": folder / "a.xml", "b": folder / "b.xml"}
+        shutil.copy(folder / "a" / "Stats.xml", sources["a"])
+        shutil.copy(folder / "b" / "Stats.xml", sources["b"])
+
+        watcher = ReportWatcher(sources, listing)
+        versions = itertools.cycle([folder / "a2" / "Stats.xml", folder / "a" / "Stats.xml"])
+        changed = []
+
+        def change_a() -> None:
+            shutil.copy(next(versions), sources["a"])
+            watcher.poll()
+            changed[:] = watcher.poll()
+
+        def derived_tables(stats: "TableStats") -> tuple:
+            return stats.combined, stats.pack_info
+
+        def reload_a() -> None:
+            watcher.reload(set(changed))
+            derived_tables(watcher.stats)
+
+        results = {
+            "load everything": best_of(lambda: derived_tables(ReportWatcher(sources, listing).stats), args.repeat),
+            "load a again": best_of(reload_a, args.repeat, setup=change_a),
+        }
+
+        # regression check: a changes while b is broken, the derived tables must come from the new tables
+        sources["b"].write_text("<Stats><SongScores>", encoding="utf8")
+        change_a()
+        try:
+            watcher.reload(set(changed))
+        except Exception as e:  # noqa: BLE001
+            print(f"broken b failed to load: {e!r}")
+        else:
+            raise AssertionError("broken Stats.xml loaded without an error")
+        expected = ReportWatcher({"a": sources["a"], "b": folder / "b" / "Stats.xml"}, listing).stats
+        pd.testing.assert_frame_equal(watcher.stats.playedsongs, expected.playedsongs)
+        pd.testing.assert_frame_equal(watcher.stats.combined, expected.combined)
+        pd.testing.assert_frame_equal(watcher.stats.pack_info, expected.pack_info)
+        print("derived tables up to date after a partly failed reload")
+        report(results, baseline="load everything")
+
+
+def bench_server(args: argparse.Namespace) -> None:
+    """
+    StatsServer answering a query from scratch vs from its cache, on a generated cab.
+    Also checks that query parameters the analyzers can't take get a 400 rather than failing in the analyzer.
+    """
+    import threading
+    import urllib.error
+    import urllib.request
+
+    from server import StatsServer
+    from watch import ReportWatcher
+
+    config = config_from_arguments(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        write_cab(config, folder)
+        watcher = ReportWatcher({"Stats.xml": folder / "Stats.xml"}, folder / "song_listing.csv")
+        server = StatsServer(("127.0.0.1", 0), watcher)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/analyzers/"
+
+        def get(query: str) -> int:
+            try:
+                with urllib.request.urlopen(url + query) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+
+        # regression check: bad parameters are the client's mistake
+        for query in [
+            "most_played_charts?limit=x",
+            "most_played_charts?modes=foo",
+            "most_played_songs?modes=dance-single,foo",
+            "highest_scores?with_ddr=false&modes=foo",
+            "highest_passes?with_ddr=false&modes=foo",
+            "period_plays?by=foo",
+            "plays_per_period?freq=Q",
+        ]:
+            status = get(query)
+            assert status == 400, f"{query}: {status}"
+        assert get("most_played_charts?modes=dance-single") == 200
+
+        query = "highest_scores?with_ddr=false&limit=100"
+        results = {
+            "from scratch": best_of(lambda: get(query), args.repeat, setup=server.cache.clear),
+            "cached": best_of(lambda: get(query), args.repeat),
+        }
+        server.shutdown()
+        server.server_close()
+        print("bad parameters rejected with 400")
+        report(results, baseline="from scratch")
+
+
+def bench_suite(args: argparse.Namespace) -> None:
+    """
+    Time the loaders, the derived TableStats tables, every analyzer and a full report run on a generated cab.
+    Results can be saved as JSON (--output) and compared against a saved earlier run (--compare),
+    to spot regressions between versions.
+    """
+    import analyzers
+    import upload_data
+    from table_stats import TableStats
+
+    config = config_from_arguments(args)
+    results = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": __import__("pandas").__version__,
+        "config": asdict(config),
+        "repeat": args.repeat,
+    }
+    seconds = results["seconds"] = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        results["counts"] = write_cab(config, folder)
+        stats_xml, listing = folder / "Stats.xml", folder / "song_listing.csv"
+        print(", ".join(f"{v} {k.replace('_', ' ')}" for k, v in results["counts"].items()))
+
+        def loader(fill: Callable[[TableStats, Path], None], path: Path) -> Callable[[], None]:
+            return lambda: fill(TableStats(), path)
+
+        seconds["fill_stats_xml"] = best_of(loader(TableStats.fill_stats_xml, stats_xml), args.repeat)
+        seconds["fill_song_listing"] = best_of(loader(TableStats.fill_song_listing, listing), args.repeat)
+        if config.upload_stages:
+            seconds["fill_upload_data"] = best_of(loader(upload_data.fill_upload_data, folder / "Upload"), args.repeat)
+
+        stats = TableStats()
+        stats.fill_stats_xml(stats_xml)
+        stats.fill_song_listing(listing)
+        if config.upload_stages:
+            upload_data.fill_upload_data(stats, folder / "Upload")
+
+        # cached TableStats tables, each timed with the ones it's built from already there
+        for name in ["combined", "pack_info", "song_shorthand", "chart_flags", "highscore_flags"]:
+            seconds[name] = best_of(
+                lambda name=name: getattr(stats, name),
+                args.repeat,
+                setup=lambda name=name: stats.__dict__.pop(name, None),
+            )
+            getattr(stats, name)
+
+        # every analyzer, each starting without any memoized tables (so pack analyzers pay for their cube)
+        for name, fn in vars(analyzers).items():
+            if not inspect.isfunction(fn) or fn.__module__ != "analyzers" or name.startswith("_"):
+                continue
+            if name in UPLOAD_ANALYZERS and not config.upload_stages:
+                continue
+            required = [
+                p for p in list(inspect.signature(fn).parameters.values())[1:] if p.default is inspect.Parameter.empty
+            ]
+            if required and name not in ANALYZER_ARGS:
+                raise ValueError(f"don't know what to call {name} with, add it to ANALYZER_ARGS")
+            analyzer_args = ANALYZER_ARGS.get(name, ())
+            seconds[name] = best_of(lambda fn=fn, a=analyzer_args: fn(stats, *a), args.repeat, setup=stats._memo.clear)
+
+        # and the whole thing, as run from the command line
+        command = [
+            sys.executable,
+            str(Path(__file__).parent / "main.py"),
+            str(stats_xml),
+            str(listing),
+            "--template",
+            str(Path(__file__).parent / "template.xlsx"),
+            "--output",
+            str(folder / "report.xlsx"),
+            "--no-cache",
+            "--jobs",
+            "1",
+        ]
+        if config.upload_stages:
+            command += ["--upload-folder", str(folder / "Upload")]
+        seconds["report"] = best_of(lambda: subprocess.run(command, check=True, capture_output=True), args.repeat)
+
+    if args.compare:
+        with open(args.compare, encoding="utf8") as f:
+            compare(results, json.load(f))
+    else:
+        for name, t in seconds.items():
+            print(f"{name:>40}: {t * 1000:10.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+BENCHMARKS = {
+    "simfile-parse": bench_simfile_parse,
+    "song-listing": bench_song_listing,
+    "song-shorthand": bench_song_shorthand,
+    "write-table": bench_write_table,
+    "watch-reload": bench_watch_reload,
+    "server": bench_server,
+    "suite": bench_suite,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="Run a micro-benchmark on generated data.")
+    parser.add_argument("benchmark", choices=list(BENCHMARKS), help="Benchmark to run.")
+    parser.add_argument("--repeat", type=int, default=3, help="Take the best of this many runs.")
+    parser.add_argument("--songs", type=int, default=100, help="simfile-parse: number of songs in the pack.")
+    parser.add_argument("--measures", type=int, default=120, help="simfile-parse: measures of notes per chart.")
+    parser.add_argument("--rows", type=int, default=500_000, help="Charts in the generated song listing.")
+    parser.add_argument("--table-rows", type=int, default=2000, help="write-table: rows in the table.")
+    parser.add_argument("--table-columns", type=int, default=40, help="write-table: columns in the table.")
+    parser.add_argument("--output", help="suite: save the results to this JSON file.")
+    parser.add_argument("--compare", metavar="JSON", help="suite: compare against results saved by an earlier run.")
+    add_config_arguments(parser)
+
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
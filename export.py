@@ -0,0 +1,103 @@
+"""
+Writing the report tables without Excel.
+
+For dashboards and scripts, the tables of each sheet (see report_tables.py) can be written out as they are:
+a CSV file per table, one JSON lines file, or a static HTML page. None of this touches openpyxl or the template,
+which is most of the time (and memory) of an Excel report.
+
+The tables are given as sheet name -> table name -> DataFrame, like the results of report_tables.sheet_tasks():
+
+>>> export_jsonl({"General": compute_general_sheet(stats)}, Path("general.jsonl"))
+"""
+
+import html
+import re
+from collections.abc import Callable
+from pathlib import Path
+
+import pandas as pd
+
+from profiling import add_rows, timed
+
+# sheet name -> table name -> table
+ReportTables = dict[str, dict[str, pd.DataFrame]]
+
+HTML_STYLE = """
+body { font-family: sans-serif; margin: 2em; }
+table { border-collapse: collapse; margin-bottom: 2em; font-size: 0.9em; }
+th, td { border: 1px solid #ccc; padding: 0.2em 0.5em; }
+th { background: #eee; }
+td { text-align: right; }
+"""
+
+
+def flat_table(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn the index into ordinary columns and the column names into one level of strings,
+    e.g. ("Doubles", "Hard") -> "Doubles Hard", for formats which can't have more.
+    """
+    df = df.reset_index() if df.index.names != [None] else df.reset_index(drop=True)
+    if df.columns.nlevels > 1:
+        columns = [" ".join(str(part) for part in column if str(part) != "") for column in df.columns]
+    else:
+        columns = [str(column) for column in df.columns]
+    return df.set_axis(columns, axis="columns")
+
+
+def file_stem(sheet_name: str) -> str:
+    """Name of a sheet as it goes into file names, e.g. "Highest Scores + Passes" -> highest_scores_passes"""
+    return re.sub(r"\W+", "_", sheet_name.lower()).strip("_")
+
+
+@timed()
+def export_csv(tables: ReportTables, path: Path) -> None:
+    """Write every table to its own CSV file in the folder `path`, named like `most_played_charts.all_songs.csv`"""
+    path.mkdir(parents=True, exist_ok=True)
+    for sheet_name, sheet_tables in tables.items():
+        for table_name, df in sheet_tables.items():
+            flat_table(df).to_csv(path / f"{file_stem(sheet_name)}.{table_name}.csv", index=False)
+            add_rows(len(df))
+
+
+@timed()
+def export_jsonl(tables: ReportTables, path: Path) -> None:
+    """
+    Write all tables to a JSON lines file, one object per table row with the sheet and table it's from:
+    {"sheet": "Recently Played Packs", "table": "packs", "pack": "...", "lastplayed": "2024-01-31T20:15:00.000"}
+    Missing values are null, times are in ISO format.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for sheet_name, sheet_tables in tables.items():
+            for table_name, df in sheet_tables.items():
+                df = flat_table(df)
+                df.insert(0, "table", table_name, allow_duplicates=True)
+                df.insert(0, "sheet", sheet_name, allow_duplicates=True)
+                f.write(df.to_json(orient="records", lines=True, date_format="iso", force_ascii=False))
+                add_rows(len(df))
+
+
+@timed()
+def export_html(tables: ReportTables, path: Path, title: str = "StepMania stats") -> None:
+    """Write all tables to one static HTML page, a section per sheet"""
+    parts = [
+        "<!DOCTYPE html>",
+        '<html><head><meta charset="utf-8">',
+        f"<title>{html.escape(title)}</title><style>{HTML_STYLE}</style>",
+        f"</head><body><h1>{html.escape(title)}</h1>",
+    ]
+    for sheet_name, sheet_tables in tables.items():
+        parts.append(f"<h2>{html.escape(sheet_name)}</h2>")
+        for table_name, df in sheet_tables.items():
+            parts.append(f"<h3>{html.escape(table_name)}</h3>")
+            parts.append(df.to_html(na_rep="", border=0))
+            add_rows(len(df))
+    parts.append("</body></html>")
+    path.write_text("\n".join(parts), encoding="utf-8")
+
+
+# --format of main.py -> (exporter, default output path)
+EXPORTERS: dict[str, tuple[Callable[[ReportTables, Path], None], str]] = {
+    "csv": (export_csv, "output"),
+    "jsonl": (export_jsonl, "output.jsonl"),
+    "html": (export_html, "output.html"),
+}
@@ -3,28 +3,147 @@
 
 import argparse
 import csv
+import hashlib
+import json
+import os
 import time
 from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from typing import Optional
 
 import simfile
-from simfile.dir import SimfileDirectory, DuplicateSimfileError
+from simfile.dir import DuplicateSimfileError, SimfileDirectory
 
+import song_listing
 
-def loadfromcsv(path: Path) -> list[list[str]]:
-    """Load data from CSV as array"""
-    with open(path, newline="", encoding="utf8") as csvfile:
-        reader = csv.reader(csvfile, delimiter=",", quotechar='"')
-        return [row for row in reader]
 
+def loadmanifest(path: Path) -> dict[str, dict]:
+    """Load scan manifest (one JSON object per line) as {song key: entry}"""
+    with open(path, encoding="utf8") as f:
+        entries = (json.loads(line) for line in f if line.strip())
+        return {entry["key"]: entry for entry in entries}
 
-def writetocsv(path: Path, data: list[list]) -> None:
-    """Write array to CSV"""
-    with open(path, "w", newline="", encoding="utf8") as csvfile:
-        writer = csv.writer(csvfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
-        for item in data:
-            writer.writerow(item)
+
+def file_digest(path: Path) -> str:
+    """Content hash of a file, used to tell whether a simfile was really edited"""
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+def fsync_file(path: Path) -> None:
+    """Make sure a file's contents have hit the disk"""
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+class ScanOutput:
+    """
+    Append-only output for a scan.
+
+    Listing rows (as CSV) and manifest entries are appended to `.partial` files next to the real outputs.
+    After each completed pack the partial files are fsynced and a checkpoint marker records
+    the pack and the size of both files. The real listing/manifest are only swapped out
+    (atomically, with os.replace) once the whole scan is done, so an interrupted scan never leaves
+    a corrupt listing behind; running the same scan again picks up after the last checkpointed pack.
+    Columnar listings are converted from the partial CSV when the scan finishes.
+    """
+
+    def __init__(self, listing_path: Path, manifest_path: Path, scan_id: dict, fmt: str = "csv") -> None:
+        """
+        scan_id: JSON-able description of the scan, a checkpoint is only resumed by an identical scan.
+        fmt: Format of the finished listing, one of song_listing.FORMATS.
+        """
+        self.listing_path = listing_path
+        self.fmt = fmt
+        self.manifest_path = manifest_path
+        self.partial_listing_path = listing_path.with_name(listing_path.name + ".partial")
+        self.partial_manifest_path = manifest_path.with_name(manifest_path.name + ".partial")
+        self.checkpoint_path = listing_path.with_name(listing_path.name + ".checkpoint")
+        self.scan_id = scan_id
+        self.listing_file = None
+        self.manifest_file = None
+
+    def open(self, packs: list[str]) -> int:
+        """
+        Open the partial files for appending. Returns the number of packs already done by an interrupted scan,
+        which is resumed if it was the same scan over the same `packs`, otherwise a fresh scan is started.
+        """
+        completed = 0
+        if self.checkpoint_path.exists():
+            with open(self.checkpoint_path, encoding="utf8") as f:
+                checkpoint = json.load(f)
+            done = checkpoint["completed"]
+            if (
+                checkpoint["scan"] == self.scan_id
+                and done <= len(packs)
+                and (packs[done - 1] if done else None) == checkpoint["last_pack"]
+                and self.partial_listing_path.exists()
+                and self.partial_manifest_path.exists()
+            ):
+                # throw away anything written after the last checkpoint
+                os.truncate(self.partial_listing_path, checkpoint["listing_size"])
+                os.truncate(self.partial_manifest_path, checkpoint["manifest_size"])
+                completed = done
+
+        mode = "a" if completed else "w"
+        self.listing_file = open(self.partial_listing_path, mode, newline="", encoding="utf8")  # noqa: SIM115
+        self.manifest_file = open(self.partial_manifest_path, mode, encoding="utf8")  # noqa: SIM115
+        self.listing_writer = csv.writer(self.listing_file, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        return completed
+
+    def append(self, rows: list, entries: list[dict]) -> None:
+        """Append listing rows and manifest entries"""
+        self.listing_writer.writerows(rows)
+        for entry in entries:
+            self.manifest_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def checkpoint(self, completed: int, last_pack: Optional[str]) -> None:
+        """Record that everything for the first `completed` packs (up to `last_pack`) has been appended"""
+        sizes = []
+        for f in (self.listing_file, self.manifest_file):
+            f.flush()
+            os.fsync(f.fileno())
+            sizes.append(os.fstat(f.fileno()).st_size)
+
+        tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(
+                {
+                    "scan": self.scan_id,
+                    "completed": completed,
+                    "last_pack": last_pack,
+                    "listing_size": sizes[0],
+                    "manifest_size": sizes[1],
+                },
+                f,
+                ensure_ascii=False,
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def close(self) -> None:
+        """Close the partial files, leaving them (and the checkpoint) around to be resumed"""
+        for f in (self.listing_file, self.manifest_file):
+            if f is not None:
+                f.close()
+
+    def finish(self) -> None:
+        """Scan is done, move the partial files into place"""
+        self.close()
+        if self.fmt != "csv":
+            columnar_path = self.listing_path.with_name(self.listing_path.name + f".partial.{self.fmt}")
+            song_listing.convert_csv(self.partial_listing_path, columnar_path, self.fmt)
+            self.partial_listing_path.unlink()
+            self.partial_listing_path = columnar_path
+
+        for partial, final in (
+            (self.partial_listing_path, self.listing_path),
+            (self.partial_manifest_path, self.manifest_path),
+        ):
+            fsync_file(partial)
+            os.replace(partial, final)
+        self.checkpoint_path.unlink()
 
 
 def translit(normal: Optional[str], transliterated: Optional[str]) -> tuple[str, str]:
@@ -70,7 +189,7 @@ def song_iterator(pack_folder: Path, secrets: bool = False) -> Iterator[tuple[Pa
             else:
                 smpath = available_sims[0]
                 print(f"{songpath} has duplicate simfiles. Choosing to parse {smpath}")
-        
+
         if smpath is None:
             # this song folder didn't contain a simfile, it's not a song
             # (eg. some packs have a folder to hold graphics)
@@ -81,6 +200,165 @@ def song_iterator(pack_folder: Path, secrets: bool = False) -> Iterator[tuple[Pa
         yield songpath, Path(smpath)
 
 
+class UnsupportedSimfileError(Exception):
+    """Simfile uses MSD features read_simfile_header() doesn't handle, parse it with the simfile library instead."""
+
+
+def read_simfile_header(smpath: Path) -> tuple[Optional[str], Optional[str], list[tuple]]:
+    """
+    Fast path for scan_simfile(): pull out only the fields the song listing needs,
+    (title, titletranslit, [(stepstype, difficulty, meter), ...]), matching what `simfile.load` would return.
+
+    Instead of tokenizing the whole file, this jumps from parameter to parameter with str.find,
+    so note data (the bulk of every simfile) is skipped over instead of being lexed.
+    Only handles the easy (and by far most common) case: anything that would need the real MSD lexer
+    to get right (escapes, `#`s inside values, comments in the fields we read or hiding a `;`)
+    raises UnsupportedSimfileError.
+    """
+    suffix = smpath.suffix.lower()
+    if suffix not in (".sm", ".ssc"):
+        raise UnsupportedSimfileError(f"unknown simfile type {suffix}")
+    is_ssc = suffix == ".ssc"
+
+    with open(smpath, encoding="utf8", errors="ignore") as f:
+        text = f.read()
+
+    def line_has_comment(pos: int) -> bool:
+        """Whether there's a `//` comment on the same line, before `pos`"""
+        return text.find("//", text.rfind("\n", 0, pos) + 1, pos) != -1
+
+    def components(start: int, end: int, count: int) -> list[str]:
+        """First `count` components of the parameter text[start:end] (starting with the key)"""
+        if text.find("//", start, end) != -1:
+            raise UnsupportedSimfileError("comment inside value")
+        return text[start:end].split(":", count)[:count]
+
+    header: dict[str, Optional[str]] = {}
+    charts: list[tuple] = []
+    ssc_chart: Optional[dict[str, Optional[str]]] = None
+
+    pos = 0
+    while (start := text.find("#", pos)) != -1:
+        # text between parameters is thrown away, but shouldn't hide a parameter start inside a comment
+        if text.find("\\", pos, start) != -1 or line_has_comment(start):
+            raise UnsupportedSimfileError("escape or comment before parameter")
+
+        start += 1
+        end = text.find(";", start)
+        if end == -1:
+            # missing semicolon at the end of the file
+            end = len(text)
+        # '#' inside a parameter is either a value we can't split naively or a missing semicolon
+        if text.find("#", start, end) != -1 or text.find("\\", start, end) != -1 or line_has_comment(end):
+            raise UnsupportedSimfileError("parameter needs the full MSD lexer")
+        pos = end + 1
+
+        colon = text.find(":", start, end)
+        key = text[start : end if colon == -1 else colon].upper()
+
+        if not is_ssc and key == "NOTES":
+            # stepstype:description:difficulty:meter:radarvalues:notes -- stop splitting before the notes
+            colons = [colon]
+            while len(colons) < 6 and colons[-1] != -1:
+                colons.append(text.find(":", colons[-1] + 1, end))
+            if colons[-1] == -1:
+                raise UnsupportedSimfileError("NOTES with missing components")
+            _, stepstype, _, difficulty, meter = components(start, colons[-1], 5)
+            charts.append((stepstype.strip(), difficulty.strip(), meter.strip()))
+        elif is_ssc and key == "NOTEDATA":
+            ssc_chart = {}
+            charts.append(ssc_chart)
+        elif key in ("TITLE", "TITLETRANSLIT", "STEPSTYPE", "DIFFICULTY", "METER"):
+            parts = components(start, end, 3)
+            value = parts[1] if len(parts) > 1 else None
+            if ssc_chart is not None:
+                ssc_chart[key] = value
+            else:
+                header[key] = value
+
+    if is_ssc:
+        charts = [(c.get("STEPSTYPE"), c.get("DIFFICULTY"), c.get("METER")) for c in charts]
+    return header.get("TITLE"), header.get("TITLETRANSLIT"), charts
+
+
+def scan_simfile(smpath: Path, fast: bool = True) -> tuple[str, list[tuple[str, str, int]]]:
+    """
+    Parse a simfile, returning its (transliterated) title and a (stepstype, difficulty, meter) tuple per chart.
+
+    fast: Try read_simfile_header() first, falling back to a full parse with the simfile library
+        if it can't handle the file.
+    """
+    if fast:
+        try:
+            title, titletranslit, charts = read_simfile_header(smpath)
+            # use the transliterated song title
+            return translit(title, titletranslit)[1], [(st, diff, int(float(meter))) for st, diff, meter in charts]
+        except (UnsupportedSimfileError, TypeError, ValueError):
+            # bad meters also end up here, so the full parse gets to raise its usual error about them
+            pass
+
+    with open(smpath, encoding="utf8", errors="ignore") as f:
+        # strict=False required to parse simfiles with text between msd tags (e.g. comments)
+        # eg. #TITLE:a;     text here
+        #     #SUBTITLE:b;
+        sm = simfile.load(f, strict=False)
+
+    # use the transliterated song title
+    songtitle = translit(sm.title, sm.titletranslit)[1]
+    return songtitle, [(c.stepstype, c.difficulty, int(float(c.meter))) for c in sm.charts]
+
+
+def scan_pack(
+    packpath: Path, songs_folder: Path, known: Optional[dict[str, Optional[dict]]] = None, fast: bool = True
+) -> list[tuple[str, dict, Optional[list[tuple]]]]:
+    """
+    Scan every song in a pack.
+    Returns a (key, manifest entry, rows) tuple per song, rows having one
+    (key, song title, stepstype, difficulty, meter) row per chart.
+
+    Manifest entries record the simfile path (relative to the songs folder), mtime, size and content hash.
+    `known` maps the keys of songs already in the listing to their manifest entry
+    (or None if the song was listed before manifests were kept). These songs are only parsed again
+    if their simfile changed, otherwise rows is None and the rows already in the listing should be reused.
+    fast: Passed to scan_simfile().
+
+    Top-level function so it can be shipped off to worker processes.
+    """
+    if known is None:
+        known = {}
+
+    results = []
+    for songpath, smpath in song_iterator(packpath):
+        key = songpath.relative_to(songs_folder).as_posix() + "/"
+        stat = smpath.stat()
+        entry = {
+            "key": key,
+            "path": smpath.relative_to(songs_folder).as_posix(),
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+        }
+
+        if key in known:
+            old = known[key]
+            # cheap check first: same simfile and untouched since last scan
+            if old is not None and all(old.get(field) == entry[field] for field in ("path", "mtime", "size")):
+                results.append((key, old, None))
+                continue
+
+            # file was touched, only parse it again if the contents actually changed
+            # (songs listed before manifests existed are trusted, they just get a manifest entry)
+            entry["hash"] = file_digest(smpath)
+            if old is None or (old.get("path") == entry["path"] and old.get("hash") == entry["hash"]):
+                results.append((key, entry, None))
+                continue
+        else:
+            entry["hash"] = file_digest(smpath)
+
+        songtitle, charts = scan_simfile(smpath, fast)
+        results.append((key, entry, [(key, songtitle, *chart) for chart in charts]))
+    return results
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         prog="getavailablesongs.py",
@@ -94,76 +372,128 @@ if __name__ == "__main__":
         action="append",
         help="If any number of these are specified, scan only these packs from the song folder.",
     )
+    parser.add_argument("--output", help="Output path. (default: song_listing.csv, or .parquet/.feather)")
+    parser.add_argument(
+        "--format",
+        choices=song_listing.FORMATS,
+        default="csv",
+        help="Output format. parquet/feather need pyarrow but load much faster for big song folders.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes to scan packs with. Output order is the same for any value.",
+    )
     parser.add_argument(
-        "--skip", help="If this script breaks, you can use this value to resume the search from a given pack name."
+        "--full-parse",
+        action="store_true",
+        help="Always parse simfiles with the simfile library, instead of only reading the fields the listing needs.",
     )
-    parser.add_argument("--output", default="song_listing.csv", help="Output path.")
 
     args = parser.parse_args()
 
     SONGS_PATH = Path(args.path)
-    OUTPUT_PATH = Path(args.output)
-    FLUSH_OUTPUT_EVERY_SECONDS = 30
+    OUTPUT_PATH = Path(args.output or "song_listing" + song_listing.suffix_for(args.format))
+    MANIFEST_PATH = OUTPUT_PATH.with_name(OUTPUT_PATH.name + ".manifest.jsonl")
 
-    # load previous data if it exists
+    # load previous data if it exists, grouped by song key
+    previous_rows: dict[str, list[list[str]]] = {}
     if OUTPUT_PATH.exists():
-        availablesongs = loadfromcsv(OUTPUT_PATH)
-        existing_keys = set(i[0] for i in availablesongs)
-    else:
-        availablesongs = []
-        existing_keys = set()
+        for row in song_listing.read_rows(OUTPUT_PATH):
+            previous_rows.setdefault(row[0], []).append(row)
+    manifest = loadmanifest(MANIFEST_PATH) if MANIFEST_PATH.exists() else {}
 
-    start = lastwrite = time.monotonic()
+    start = time.monotonic()
 
-    def pack_listing(songs_folder: Path, pack_filter: list[str], skip_to_pack: Optional[str]) -> Iterator[Path]:
-        """Iterate over packs to scan based on command-line options."""
+    def pack_listing(songs_folder: Path, pack_filter: Optional[list[str]]) -> list[Path]:
+        """List packs to scan based on command-line options."""
         if pack_filter is None:
-            allpacks = pack_iterator(songs_folder)
-        else:
-            allpacks = [songs_folder / i for i in pack_filter]
+            return pack_iterator(songs_folder)
+        return [songs_folder / i for i in pack_filter]
 
-        skipping = skip_to_pack is not None
-        for packpath in allpacks:
-            packname = packpath.name
+    def pack_prefix(packpath: Path) -> str:
+        """First segment of the song keys belonging to this pack."""
+        return packpath.relative_to(SONGS_PATH).parts[0]
 
-            # skip entries until (skip_to_pack) is found
-            if packname == skip_to_pack:
-                skipping = False
-            if skipping:
-                continue
+    allpacks = pack_listing(SONGS_PATH, args.pack)
+    packnames = [pack_prefix(packpath) for packpath in allpacks]
 
-            yield packpath
+    # group already listed songs by pack so workers only get sent the ones they need
+    known_by_pack: dict[str, dict[str, Optional[dict]]] = {}
+    for key in previous_rows:
+        known_by_pack.setdefault(key.split("/")[0], {})[key] = manifest.get(key)
 
+    output = ScanOutput(
+        OUTPUT_PATH, MANIFEST_PATH, {"songs": str(SONGS_PATH.resolve()), "packs": args.pack}, args.format
+    )
+    completed = output.open(packnames)
+    if completed == 0:
+        # Previous data for packs this scan doesn't cover (not picked with --pack) is kept as it was,
+        # unless the pack has been deleted. Songs in scanned packs come from the scan.
+        scanning = set(packnames)
+        kept = [
+            key
+            for key in previous_rows
+            if key.split("/")[0] not in scanning and (SONGS_PATH / key.split("/")[0]).is_dir()
+        ]
+        output.append([row for key in kept for row in previous_rows[key]], [manifest[k] for k in kept if k in manifest])
+        output.checkpoint(0, None)
+    else:
+        print(f"Resuming interrupted scan after pack {packnames[completed - 1]} ({completed}/{len(allpacks)})")
+
+    fast = not args.full_parse
+    remaining = allpacks[completed:]
+    pool = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+    parsed = unchanged = 0
     try:
-        allpacks = list(pack_listing(SONGS_PATH, args.pack, args.skip))
-        for i, packpath in enumerate(allpacks):
-            # show which pack we're currently on cause the scan takes a while
+        if pool is None:
+            # scan in this process, one pack after another
+            def scans() -> Iterator[tuple[int, list]]:  # noqa: D103
+                for i, packpath in enumerate(remaining):
+                    yield i, scan_pack(packpath, SONGS_PATH, known_by_pack.get(pack_prefix(packpath)), fast)
+        else:
+            # hand every pack to the pool, results come back in whatever order the workers finish them
+            def scans() -> Iterator[tuple[int, list]]:  # noqa: D103
+                futures = {
+                    pool.submit(scan_pack, packpath, SONGS_PATH, known_by_pack.get(pack_prefix(packpath)), fast): i
+                    for i, packpath in enumerate(remaining)
+                }
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+
+        # results may finish out of order, hold them back until every pack before them is done
+        # so the output stays in pack order
+        finished: dict[int, list] = {}
+        next_pack = 0
+        for done, (i, songs) in enumerate(scans()):
+            # show which pack just finished cause the scan takes a while
             now = time.monotonic()
-            print(f"{now-start} | ({i+1}/{len(allpacks)}) {packpath}")
-
-            for songpath, smpath in song_iterator(packpath):
-                key = songpath.relative_to(SONGS_PATH).as_posix() + "/"
-
-                # skip adding entries for this song if it already exists
-                if key in existing_keys:
-                    continue
-
-                # flush the output file every once in a while
-                now = time.monotonic()
-                if now - lastwrite > FLUSH_OUTPUT_EVERY_SECONDS:
-                    writetocsv(OUTPUT_PATH, availablesongs)
-                    lastwrite = now
-
-                with open(smpath, encoding="utf8", errors="ignore") as f:
-                    # strict=False required to parse simfiles with text between msd tags (e.g. comments)
-                    # eg. #TITLE:a;     text here
-                    #     #SUBTITLE:b;
-                    sm = simfile.load(f, strict=False)
-
-                # add data to file
-                # use the transliterated song title
-                songtitle = translit(sm.title, sm.titletranslit)[1]
-                for c in sm.charts:
-                    availablesongs.append((key, songtitle, c.stepstype, c.difficulty, int(float(c.meter))))
+            print(f"{now-start} | ({completed+done+1}/{len(allpacks)}) {remaining[i]}")
+
+            finished[i] = songs
+            while next_pack in finished:
+                rows, entries = [], []
+                for key, entry, songrows in finished.pop(next_pack):
+                    if songrows is None:
+                        # unchanged since last scan
+                        songrows = previous_rows[key]
+                        unchanged += 1
+                    else:
+                        parsed += 1
+                    rows.extend(songrows)
+                    entries.append(entry)
+                output.append(rows, entries)
+                next_pack += 1
+                output.checkpoint(completed + next_pack, packnames[completed + next_pack - 1])
+    except BaseException:
+        print("Scan interrupted, run the same command again to pick up where it left off")
+        raise
+    else:
+        output.finish()
     finally:
-        writetocsv(OUTPUT_PATH, availablesongs)
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        output.close()
+        print(f"Parsed {parsed} new or changed simfiles, {unchanged} unchanged")
@@ -10,55 +10,187 @@ if __name__ == "__main__":
         description="",
     )
 
-    parser.add_argument("stats_xml", help="Path to Stats.xml.")
+    parser.add_argument(
+        "stats_xml",
+        nargs="+",
+        help="Path to Stats.xml. Give several (from different cabs or player profiles) to combine them, "
+        "as NAME=PATH to name each one (the path is used otherwise)",
+    )
     parser.add_argument("song_listing_csv", help="Path to file generated by getavailablesongs.py")
+    parser.add_argument(
+        "--upload-folder", help="Path to the Save/Upload folder, to load a record of every play (optional)"
+    )
     parser.add_argument("--template", default="template.xlsx", help="Path to template .xlsx file")
-    parser.add_argument("--output", default="output.xlsx", help="Output path")
+    parser.add_argument(
+        "--format",
+        choices=["xlsx", "csv", "jsonl", "html"],
+        default="xlsx",
+        help="Excel workbook from the template, or just the tables: a CSV file per table, JSON lines or an HTML page",
+    )
+    parser.add_argument(
+        "--output",
+        help="Output path (default output.xlsx, output.jsonl or output.html; for csv, a folder called output)",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Write the workbook row by row instead of filling in the template in memory (for very large reports)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running, and update the report whenever the input files change (the cache isn't used)",
+    )
+    parser.add_argument(
+        "--watch-interval", type=float, default=0.25, help="How often to check the input files in --watch, in seconds"
+    )
+    parser.add_argument("--cache-dir", default=".cache", help="Where to cache parsed data between runs")
+    parser.add_argument("--cache-size", type=int, default=1024, help="Size limit of the cache directory in MB")
+    parser.add_argument("--no-cache", action="store_true", help="Always parse the input files from scratch")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="Number of sheets to compute at the same time (default 1), "
+        "and of input files to read at the same time (default one per CPU)",
+    )
+    parser.add_argument("--memory-report", action="store_true", help="Print memory used by each data table")
+    parser.add_argument(
+        "--profile", action="store_true", help="Print wall time, peak memory and rows processed for each stage"
+    )
+    parser.add_argument(
+        "--profile-dump",
+        metavar="PATH",
+        help="Save cProfile data for the slowest stage to PATH (implies --profile, runs with --jobs 1)",
+    )
 
     args = parser.parse_args()
 
     # arguments good, now import everything and run the main script
 
     print("Prepping libraries...")
+    import contextlib
+    import time
     from pathlib import Path
 
-    from openpyxl import load_workbook
-    from openpyxl.worksheet.worksheet import Worksheet
-
-    import analysis
-    from table_stats import TableStats
+    import profiling
+    from profiling import timed
+    from report_tables import SHEET_TABLES, sheet_tasks
+    from table_stats import TableStats, stats_sources
+    from tasks import run_tasks
+
+    if args.profile_dump:
+        # cProfile can only profile one stage at a time
+        args.profile = True
+        args.jobs = 1
+    if args.profile:
+        profiling.enable(profile_stages=bool(args.profile_dump))
+
+    # source name -> Stats.xml
+    try:
+        sources = stats_sources(args.stats_xml)
+    except ValueError as e:
+        parser.error(str(e))
 
     s = TableStats()
-    print("Loading Stats.xml...")
-    s.fill_stats_xml(Path(args.stats_xml))
-    print("Loading song listing data...")
-    s.fill_song_listing(Path(args.song_listing_csv))
-
-    wb = load_workbook(args.template)
-
-    def fetch(sheet_name: str) -> Worksheet:  # noqa: D103
-        print(f"Generating {sheet_name} sheet...")
-        return wb[sheet_name]
-
-    ws = fetch("General")
-    analysis.create_general_sheet(ws, s)
-
-    ws = fetch("Most Played Charts")
-    analysis.create_most_played_charts_sheet(ws, s)
-
-    ws = fetch("Most Played Songs")
-    analysis.create_most_played_songs_sheet(ws, s)
-
-    ws = fetch("Most Played Packs")
-    analysis.create_most_played_packs_sheet(ws, s)
-
-    ws = fetch("Recently Played Packs")
-    analysis.create_recently_played_packs_sheet(ws, s)
-
-    ws = fetch("Pack Completion")
-    analysis.create_pack_completion_sheet(ws, s)
-
-    ws = fetch("Highest Scores + Passes")
-    analysis.create_highest_scores_sheet(ws, s)
-
-    wb.save(args.output)
+    if args.watch:
+        from watch import ReportWatcher
+
+        print("Loading input files...")
+        upload_folder = Path(args.upload_folder) if args.upload_folder else None
+        watcher = ReportWatcher(sources, Path(args.song_listing_csv), upload_folder, jobs=args.jobs)
+        s = watcher.stats
+    elif args.no_cache:
+        print("Loading Stats.xml...")
+        if len(sources) == 1:
+            s.fill_stats_xml(*sources.values())
+        else:
+            s.fill_stats_xmls(sources, jobs=args.jobs)
+        print("Loading song listing data...")
+        s.fill_song_listing(Path(args.song_listing_csv))
+        if args.upload_folder:
+            import upload_data
+
+            print("Loading upload folder...")
+            upload_data.fill_upload_data(s, Path(args.upload_folder))
+    else:
+        from stats_cache import TableStatsCache
+
+        cache = TableStatsCache(Path(args.cache_dir), max_bytes=args.cache_size * 2**20)
+        print("Loading Stats.xml...")
+        if len(sources) > 1:
+            from_cache = cache.fill_stats_xmls(s, sources, jobs=args.jobs)
+            for name, cached in from_cache.items():
+                print(f"  {name}: {'from cache' if cached else cache.stats_states[name].summary()}")
+        elif cache.fill_stats_xml(s, *sources.values()):
+            print("  (from cache)")
+        elif cache.stats_state.incremental:
+            print(f"  ({cache.stats_state.summary()})")
+        print("Loading song listing data...")
+        if cache.fill_song_listing(s, Path(args.song_listing_csv)):
+            print("  (from cache)")
+        if args.upload_folder:
+            print("Loading upload folder...")
+            if cache.fill_upload_data(s, Path(args.upload_folder)):
+                print("  (from cache)")
+            else:
+                print(f"  ({cache.upload_state.summary()})")
+        cache.fill_derived(s)
+
+    # the analyzers share the cached tables of TableStats, which aren't made for being worked out
+    # by several threads at once, so computing sheets concurrently is only done when asked for
+    sheet_jobs = args.jobs or 1
+
+    def write_report(s: TableStats) -> None:
+        """Compute the sheets and write the report to the output"""
+        print(f"Computing sheets ({sheet_jobs} jobs)...")
+        start = time.perf_counter()
+        tables = run_tasks(sheet_tasks(s), jobs=sheet_jobs)
+        print(f"  took {time.perf_counter() - start:.2f}s")
+
+        if args.format != "xlsx":
+            # just the tables: no openpyxl or template needed
+            import export
+
+            exporter, default_output = export.EXPORTERS[args.format]
+            output = Path(args.output or default_output)
+            print(f"Writing {output}...")
+            exporter({sheet_name: tables[sheet_name] for sheet_name in SHEET_TABLES}, output)
+        else:
+            from openpyxl import load_workbook
+
+            import analysis
+
+            output = args.output or "output.xlsx"
+            # openpyxl isn't thread-safe, so the workbook is only touched from here
+            with timed("load template"):
+                wb = load_workbook(args.template)
+            layouts = {}
+            for sheet_name, (_, write_sheet) in analysis.SHEETS.items():
+                print(f"Generating {sheet_name} sheet...")
+                if args.streaming:
+                    layouts[sheet_name] = analysis.SheetLayout()
+                    write_sheet(layouts[sheet_name], tables[sheet_name])
+                else:
+                    write_sheet(wb[sheet_name], tables[sheet_name])
+
+            with timed("save workbook"):
+                if args.streaming:
+                    analysis.save_streaming(wb, layouts, output)
+                else:
+                    wb.save(output)
+
+    write_report(s)
+    if args.watch:
+        print(f"Watching for changes every {args.watch_interval}s (Ctrl+C to stop)...")
+        with contextlib.suppress(KeyboardInterrupt):
+            watcher.watch(write_report, interval=args.watch_interval)
+
+    if args.profile:
+        print()
+        profiling.print_report()
+    if args.profile_dump:
+        print()
+        profiling.dump_slowest_profile(args.profile_dump)
+
+    if args.memory_report:
+        print(s.memory_report().to_string(float_format="{:.1f}".format))
@@ -0,0 +1,221 @@
+"""
+Timing instrumentation for the report pipeline.
+
+Loaders, cached tables, analyzers and sheet writers are wrapped with `timed`, which works as a decorator
+or a context manager. Nothing is recorded unless profiling is switched on with enable(),
+so the cost of leaving the instrumentation in place is one flag check per call.
+
+>>> @timed()
+... def most_played_packs(stats): ...
+>>> with timed("save workbook"):
+...     wb.save(path)
+>>> enable()
+>>> ...  # run things
+>>> print_report()
+
+Each stage records wall time, the process's peak RSS when it finished, and rows processed
+(the length of a returned DataFrame/Series, or whatever the code reports with add_rows()).
+"""
+
+import cProfile
+import functools
+import io
+import pstats
+import sys
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any, Optional, TextIO, TypeVar
+
+import pandas as pd
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass
+class Stage:
+    """One timed run of a stage."""
+
+    name: str
+    # how many stages this one is nested in (within its own thread)
+    depth: int = 0
+    start: float = 0.0  # perf_counter() value
+    wall: float = 0.0
+    peak_rss: Optional[int] = None  # bytes
+    rows: Optional[int] = None
+    # cProfile data, only for top-level stages and only if asked for
+    profile: Optional[cProfile.Profile] = field(default=None, repr=False)
+
+
+_enabled = False
+_profile_stages = False
+_stages: list[Stage] = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable(profile_stages: bool = False) -> None:
+    """
+    Start recording stages (clearing anything recorded before).
+    profile_stages: Also run a cProfile profiler for each top-level stage, see dump_slowest_profile().
+        Only one profiler can run at a time, so don't run stages concurrently with this on.
+    """
+    global _enabled, _profile_stages
+    with _lock:
+        _stages.clear()
+    _enabled = True
+    _profile_stages = profile_stages
+
+
+def disable() -> None:  # noqa: D103
+    global _enabled
+    _enabled = False
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident memory of this process so far in bytes, or None if there's no way to tell on this platform."""
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def count_rows(result: Any) -> Optional[int]:  # noqa: ANN401
+    """Rows in a stage's result: the length of a DataFrame/Series, summed over a dict of them."""
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, dict):
+        counts = [count_rows(v) for v in result.values()]
+        counts = [c for c in counts if c is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def _stack() -> list[Stage]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def add_rows(n: int) -> None:
+    """Count n more rows as processed by the innermost running stage (of this thread)."""
+    if _enabled and (stack := _stack()):
+        stage = stack[-1]
+        stage.rows = (stage.rows or 0) + n
+
+
+class timed:  # noqa: N801
+    """
+    Time a function (as a decorator) or a block of code (as a context manager) as a named stage.
+    Decorated functions are named after their qualified name by default, e.g. "TableStats.combined".
+    """
+
+    def __init__(self, name: Optional[str] = None) -> None:  # noqa: D107
+        self.name = name
+
+    def __call__(self, fn: F) -> F:  # noqa: D102
+        name = self.name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs) -> Any:  # noqa: ANN002, ANN003, ANN401
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with timed(name) as stage:
+                result = fn(*args, **kwargs)
+                if stage.rows is None:
+                    stage.rows = count_rows(result)
+            return result
+
+        return wrapper
+
+    def __enter__(self) -> Stage:  # noqa: D105
+        self.stage = Stage(self.name or "?")
+        if not _enabled:
+            return self.stage
+
+        stack = _stack()
+        self.stage.depth = len(stack)
+        stack.append(self.stage)
+        if _profile_stages and self.stage.depth == 0:
+            self.stage.profile = cProfile.Profile()
+            self.stage.profile.enable()
+        self.stage.start = time.perf_counter()
+        return self.stage
+
+    def __exit__(self, *exc_info: object) -> None:  # noqa: D105
+        if not _enabled or not _stack() or _stack()[-1] is not self.stage:
+            return
+        self.stage.wall = time.perf_counter() - self.stage.start
+        if self.stage.profile is not None:
+            self.stage.profile.disable()
+        self.stage.peak_rss = peak_rss()
+        _stack().pop()
+        with _lock:
+            _stages.append(self.stage)
+
+
+def stages() -> list[Stage]:
+    """Every stage recorded so far, in the order they finished."""
+    with _lock:
+        return list(_stages)
+
+
+def summary() -> pd.DataFrame:
+    """
+    Sum up the recorded stages, adding repeated runs of the same stage together.
+    (stage) -> (depth, calls, wall, peak_rss, rows), in the order the stages first started.
+    """
+    rows = {}
+    # stages are recorded when they finish, which puts nested stages before their parent
+    for stage in sorted(stages(), key=lambda s: s.start):
+        if stage.name not in rows:
+            rows[stage.name] = {"depth": stage.depth, "calls": 0, "wall": 0.0, "peak_rss": None, "rows": None}
+        row = rows[stage.name]
+        row["calls"] += 1
+        row["wall"] += stage.wall
+        if stage.peak_rss is not None:
+            row["peak_rss"] = max(row["peak_rss"] or 0, stage.peak_rss)
+        if stage.rows is not None:
+            row["rows"] = (row["rows"] or 0) + stage.rows
+    return pd.DataFrame.from_dict(rows, orient="index", columns=["depth", "calls", "wall", "peak_rss", "rows"])
+
+
+def print_report(file: TextIO = sys.stdout) -> None:
+    """Print a table of the recorded stages: wall time, peak RSS and rows processed."""
+    df = summary()
+    print(f"{'stage':<50} {'calls':>5} {'wall (s)':>9} {'peak RSS (MB)':>14} {'rows':>10}", file=file)
+    for row in df.itertuples():
+        label = "  " * row.depth + row.Index
+        rss = "n/a" if pd.isna(row.peak_rss) else f"{row.peak_rss / 2**20:.0f}"
+        rows = "" if pd.isna(row.rows) else f"{int(row.rows)}"
+        print(f"{label:<50} {row.calls:>5} {row.wall:>9.3f} {rss:>14} {rows:>10}", file=file)
+
+
+def dump_slowest_profile(path: str, lines: int = 20, file: TextIO = sys.stdout) -> Optional[Stage]:
+    """
+    Save the cProfile data of the slowest top-level stage to `path` (load it with pstats or snakeviz)
+    and print its top functions by cumulative time. Needs enable(profile_stages=True).
+    Returns the stage, or None if no stage was profiled.
+    """
+    profiled = [s for s in stages() if s.profile is not None]
+    if not profiled:
+        return None
+    slowest = max(profiled, key=lambda s: s.wall)
+    slowest.profile.dump_stats(path)
+
+    out = io.StringIO()
+    pstats.Stats(slowest.profile, stream=out).sort_stats("cumulative").print_stats(lines)
+    print(f"Slowest stage: {slowest.name} ({slowest.wall:.3f}s), profile saved to {path}", file=file)
+    print(out.getvalue(), file=file)
+    return slowest
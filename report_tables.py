@@ -0,0 +1,127 @@
+"""
+The tables of each report sheet.
+
+Every sheet has a compute step here, which runs the analyzers and returns the sheet's finished tables by name.
+They're pure pandas: safe to run concurrently with other sheets (see sheet_tasks()), and with no openpyxl involved,
+so the same tables can go into the Excel template (the write steps in analysis.py) or be exported as they are
+(export.py).
+"""
+
+from collections.abc import Callable
+from typing import Optional
+
+import pandas as pd
+
+import analyzers
+from profiling import timed
+from table_stats import TableStats
+from tasks import Task
+
+
+@timed()
+def compute_general_sheet(stats: TableStats, mode_labels: Optional[dict[str, str]] = None) -> dict[str, pd.DataFrame]:
+    """Compute tables for the General sheet"""
+    if mode_labels is None:
+        mode_labels = {"dance-single": "Singles", "dance-double": "Doubles"}
+
+    return {
+        "chart_counts": analyzers.chart_counts_for_each_pack(stats, mode_labels),
+        "histogram": analyzers.pack_difficulty_histogram(stats),
+    }
+
+
+@timed()
+def compute_most_played_charts_sheet(stats: TableStats, limit: int = 50) -> dict[str, pd.DataFrame]:
+    """Compute tables for the Most Played Charts sheet"""
+    return {
+        "all_songs": analyzers.most_played_charts(stats, limit, modes=["dance-single", "dance-double"]),
+        "doubles_only": analyzers.most_played_charts(stats, limit, modes=["dance-double"]),
+    }
+
+
+@timed()
+def compute_most_played_songs_sheet(stats: TableStats, limit: int = 50) -> dict[str, pd.DataFrame]:
+    """Compute tables for the Most Played Songs sheet"""
+    return {
+        "all_songs": analyzers.most_played_songs(stats, limit, modes=["dance-single", "dance-double"]),
+        "doubles_only": analyzers.most_played_songs(stats, limit, modes=["dance-double"]),
+    }
+
+
+@timed()
+def compute_most_played_packs_sheet(stats: TableStats) -> dict[str, pd.DataFrame]:
+    """Compute tables for the Most Played Packs sheet"""
+    packs_by_playcount = analyzers.most_played_packs(stats)
+    song_breakdown = analyzers.most_played_charts_per_pack(stats)
+
+    return {"packs": packs_by_playcount.join(song_breakdown)}
+
+
+@timed()
+def compute_recently_played_packs_sheet(stats: TableStats) -> dict[str, pd.DataFrame]:
+    """Compute tables for the Recently Played Packs sheet"""
+    return {"packs": analyzers.recently_played_packs(stats)}
+
+
+@timed()
+def compute_pack_completion_sheet(stats: TableStats) -> dict[str, pd.DataFrame]:
+    """Compute tables for the Pack Completion sheet"""
+    completion = analyzers.pack_completion(stats)
+
+    # note: column labels for grade boundaries aren't written out in code,
+    # they're hardcoded in the Excel sheet so user has maximal control over formatting.
+    # if grade boundaries are changed the excel sheet has to be modified as well
+    grade_breakdown = analyzers.pack_score_breakdown(stats, analyzers.GRADE_BY_10)
+
+    return {"completion": completion.join(grade_breakdown)}
+
+
+@timed()
+def compute_highest_scores_sheet(stats: TableStats) -> dict[str, pd.DataFrame]:
+    """Compute tables for the Highest Scores + Passes sheet"""
+    # ideas for other ways to split it
+    #   - top 5 for each block difficulty
+    #   - highest scores (DDR only)
+    # there are too many ways to slice the highscore data --
+    # I think the only way to make it useful is to make it interactive
+    return {
+        "scores_singles": analyzers.highest_scores(stats, with_ddr=False, modes=["dance-single"]),
+        "passes_singles": analyzers.highest_passes(stats, with_ddr=False, modes=["dance-single"]),
+        "scores_doubles": analyzers.highest_scores(stats, with_ddr=False, modes=["dance-double"]),
+        "passes_doubles": analyzers.highest_passes(stats, with_ddr=False, modes=["dance-double"]),
+    }
+
+
+# sheet name in the template -> compute step
+SHEET_TABLES: dict[str, Callable[[TableStats], dict[str, pd.DataFrame]]] = {
+    "General": compute_general_sheet,
+    "Most Played Charts": compute_most_played_charts_sheet,
+    "Most Played Songs": compute_most_played_songs_sheet,
+    "Most Played Packs": compute_most_played_packs_sheet,
+    "Recently Played Packs": compute_recently_played_packs_sheet,
+    "Pack Completion": compute_pack_completion_sheet,
+    "Highest Scores + Passes": compute_highest_scores_sheet,
+}
+
+
+def sheet_tasks(stats: TableStats) -> dict[str, Task]:
+    """
+    Tasks computing the tables of every sheet in SHEET_TABLES, see tasks.run_tasks().
+    The results are keyed by sheet name.
+    The TableStats tables shared between sheets are warmed up first,
+    so concurrent sheets don't end up computing the same thing at the same time.
+    """
+    warm_up = {
+        "combined": Task(lambda: stats.combined),
+        "pack_info": Task(lambda: stats.pack_info, deps=("combined",)),
+        "song_shorthand": Task(lambda: stats.song_shorthand, deps=("combined",)),
+        "chart_flags": Task(lambda: stats.chart_flags, deps=("combined",)),
+        "highscore_flags": Task(lambda: stats.highscore_flags, deps=("pack_info",)),
+        "pack_chart_cube": Task(lambda: analyzers.pack_chart_cube(stats), deps=("chart_flags",)),
+        "pack_song_cube": Task(lambda: analyzers.pack_song_cube(stats), deps=("chart_flags",)),
+    }
+    sheets = {
+        name: Task(lambda compute=compute: compute(stats), deps=tuple(warm_up))
+        for name, compute in SHEET_TABLES.items()
+    }
+    return warm_up | sheets
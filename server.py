@@ -0,0 +1,339 @@
+"""
+Local HTTP server answering queries on the stats (e.g. for a screen next to the cab), as JSON.
+
+The data is loaded once and kept in memory (and up to date with the input files, see watch.py).
+Every analyzer in analyzers.py is an endpoint, with its arguments as query parameters:
+
+    GET /analyzers                                           -> the endpoints and their parameters
+    GET /analyzers/most_played_charts?limit=10&modes=dance-double
+    GET /analyzers/plays_per_period?freq=W&start=2024-01-01
+    GET /analyzers/pack_score_breakdown?grade_boundaries=0.99:AAA,0.96:AA,0.89:A,0:B
+
+Results are the rows of the analyzer's table, as in `main.py --format jsonl` (see export.flat_table).
+They go into an LRU cache, emptied when the data is loaded again. Requests are served in threads;
+a query that's already being worked out for another request waits for that result instead of running again.
+Only the standard library on top of what the report needs.
+
+    py server.py Stats.xml song_listing.csv --port 8000
+"""
+
+import inspect
+import json
+import threading
+import time
+import typing
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import analyzers
+from export import flat_table
+from watch import ReportWatcher
+
+TRUE = {"1", "true", "yes", "on"}
+FALSE = {"0", "false", "no", "off"}
+
+
+def parse_bool(value: str) -> bool:  # noqa: D103
+    if value.lower() in TRUE:
+        return True
+    if value.lower() in FALSE:
+        return False
+    raise ValueError(f"expected true or false, not {value!r}")
+
+
+def parse_list(value: str) -> list[str]:
+    """Split comma separated values, e.g. dance-single,dance-double"""
+    return [part for part in value.split(",") if part]
+
+
+def mapping_parser(key: Callable[[str], Any]) -> Callable[[str], dict]:
+    """Make a parser for comma separated key:value pairs, e.g. dance-single:Singles,dance-double:Doubles"""
+
+    def parse(value: str) -> dict:
+        pairs = [pair.rpartition(":") for pair in parse_list(value)]
+        if not all(sep for _, sep, _ in pairs):
+            raise ValueError(f"expected key:value pairs, not {value!r}")
+        return {key(k): v for k, _, v in pairs}
+
+    return parse
+
+
+def choice_parser(choices: tuple[str, ...]) -> Callable[[str], str]:
+    """Make a parser for a parameter annotated Literal[...], which only takes one of those values"""
+
+    def parse(value: str) -> str:
+        if value not in choices:
+            raise ValueError(f"expected one of {', '.join(choices)}, not {value!r}")
+        return value
+
+    return parse
+
+
+# parameter annotation (without Optional) -> parser for its query parameter
+PARSERS: dict[Any, Callable[[str], Any]] = {
+    str: str,
+    int: int,
+    float: float,
+    bool: parse_bool,
+    list: parse_list,
+    pd.Timestamp: pd.Timestamp,
+    dict[str, str]: mapping_parser(str),
+    dict[float, str]: mapping_parser(float),
+}
+
+
+def parameter_parsers(fn: Callable) -> Optional[dict[str, Callable[[str], Any]]]:
+    """
+    Query parameter parsers for the parameters of an analyzer (after `stats`), going by their annotations.
+    None if it isn't an analyzer or some parameter can't be given in a query.
+    """
+    hints = typing.get_type_hints(fn)
+    parameters = list(inspect.signature(fn).parameters)
+    if not parameters or parameters[0] != "stats" or hints.get("return") is not pd.DataFrame:
+        return None
+    parsers = {}
+    for name in parameters[1:]:
+        annotation = hints.get(name)
+        # Optional[X] -> X
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if typing.get_origin(annotation) is typing.Union and len(args) == 1:
+            annotation = args[0]
+        choices = typing.get_args(annotation)
+        if typing.get_origin(annotation) is typing.Literal and all(isinstance(choice, str) for choice in choices):
+            parsers[name] = choice_parser(choices)
+        elif annotation in PARSERS:
+            parsers[name] = PARSERS[annotation]
+        else:
+            return None
+    return parsers
+
+
+def find_endpoints() -> dict[str, tuple[Callable[..., pd.DataFrame], dict[str, Callable[[str], Any]]]]:
+    """Analyzers which can be queried: name -> (analyzer, parameter parsers)"""
+    endpoints = {}
+    for name, fn in inspect.getmembers(analyzers, inspect.isfunction):
+        if name.startswith("_") or fn.__module__ != analyzers.__name__:
+            continue
+        if (parsers := parameter_parsers(fn)) is not None:
+            endpoints[name] = (fn, parsers)
+    return endpoints
+
+
+ENDPOINTS = find_endpoints()
+
+
+def hashable(value: Any) -> Hashable:  # noqa: ANN401
+    """Value of a parsed query parameter in a form that can go in a cache key"""
+    if isinstance(value, dict):
+        return tuple(sorted(value.items()))
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+class QueryCache:
+    """
+    LRU cache of query results.
+    Requests for a query that's being computed wait for that computation to finish rather than starting another.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:  # noqa: D107
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.results: OrderedDict[Hashable, bytes] = OrderedDict()
+        self.pending: dict[Hashable, Future] = {}
+        # bumped by clear(), so results computed from old data don't get stored
+        self.generation = 0
+
+    def get(self, key: Hashable, compute: Callable[[], bytes]) -> bytes:
+        """Return the cached result for `key`, calling compute() for it if there isn't one yet"""
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                return self.results[key]
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = self.pending[key] = Future()
+            generation = self.generation
+        if not owner:
+            return future.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                if self.pending.get(key) is future:
+                    del self.pending[key]
+        with self.lock:
+            if self.generation == generation:
+                self.results[key] = result
+                while len(self.results) > self.max_entries:
+                    self.results.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def clear(self) -> None:
+        """Forget every result, and the queries being computed, after the data changed"""
+        with self.lock:
+            self.results.clear()
+            self.pending.clear()
+            self.generation += 1
+
+
+class StatsServer(ThreadingHTTPServer):
+    """HTTP server holding the data loaded by a ReportWatcher, see the module docstring for the endpoints."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], watcher: ReportWatcher, cache_entries: int = 256) -> None:
+        """
+        watcher: Where the data comes from. The server works on `watcher.stats`,
+        call reload_changed() to keep it up to date (see watch()).
+        """
+        super().__init__(address, QueryHandler)
+        self.watcher = watcher
+        self.cache = QueryCache(cache_entries)
+        # held while an analyzer runs or the data is being loaded again: TableStats isn't made for either
+        # to happen while another one is going on (analyzers mostly hold the GIL anyway)
+        self.data_lock = threading.Lock()
+
+    def query(self, name: str, params: dict[str, list[str]]) -> bytes:
+        """
+        JSON result of an analyzer for the query parameters of a request.
+        Raises KeyError for unknown analyzers, ValueError or TypeError for bad parameters.
+        """
+        fn, parsers = ENDPOINTS[name]
+        unknown = params.keys() - parsers.keys()
+        if unknown:
+            raise ValueError(f"unknown parameters: {', '.join(sorted(unknown))}")
+        kwargs = {param: parsers[param](values[-1]) for param, values in params.items()}
+        if kwargs.get("modes"):
+            self.check_modes(kwargs["modes"])
+        bound = inspect.signature(fn).bind(None, **kwargs)
+        bound.apply_defaults()
+        key = (name, tuple((param, hashable(value)) for param, value in bound.arguments.items() if param != "stats"))
+
+        def compute() -> bytes:
+            with self.data_lock:
+                df = fn(self.watcher.stats, **kwargs)
+            return flat_table(df).to_json(orient="records", date_format="iso", force_ascii=False).encode("utf8")
+
+        return self.cache.get(key, compute)
+
+    def check_modes(self, modes: Iterable[str]) -> None:
+        """Raise ValueError for steptypes that aren't in the data (filtering the analyzers' tables by them fails)"""
+        with self.data_lock:
+            steptypes = self.watcher.stats.combined.index.unique(level="steptype")
+        unknown = set(modes) - set(steptypes)
+        if unknown:
+            raise ValueError(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    def reload_changed(self) -> bool:
+        """Load the input files that changed again (see ReportWatcher.poll), returns whether any did"""
+        inputs = self.watcher.poll()
+        if not inputs:
+            return False
+        try:
+            with self.data_lock:
+                self.watcher.reload(inputs)
+        finally:
+            # (some of them may have been loaded even if one failed)
+            self.cache.clear()
+        return True
+
+    def watch(self, interval: float = 0.25) -> None:
+        """Keep the data up to date with the input files, polling every `interval` seconds (doesn't return)"""
+        while True:
+            time.sleep(interval)
+            try:
+                if self.reload_changed():
+                    print("Input files changed, data loaded again")
+            except (OSError, ET.ParseError, ValueError) as e:
+                print(f"Couldn't load the changed input files, keeping the previous data: {e!r}")
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Handler for requests to a StatsServer."""
+
+    server: StatsServer
+
+    def do_GET(self) -> None:  # noqa: N802, D102
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        if parts == ["analyzers"]:
+            body = {
+                name: {param: str(inspect.signature(fn).parameters[param]) for param in parsers}
+                for name, (fn, parsers) in ENDPOINTS.items()
+            }
+            self.respond(HTTPStatus.OK, json.dumps(body).encode("utf8"))
+            return
+        if len(parts) != 2 or parts[0] != "analyzers" or parts[1] not in ENDPOINTS:
+            self.error(HTTPStatus.NOT_FOUND, f"no such endpoint: {url.path}")
+            return
+
+        try:
+            body = self.server.query(parts[1], parse_qs(url.query, keep_blank_values=True))
+        except (ValueError, TypeError) as e:
+            self.error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        except Exception as e:
+            self.error(HTTPStatus.INTERNAL_SERVER_ERROR, repr(e))
+            raise
+        self.respond(HTTPStatus.OK, body)
+
+    def error(self, status: HTTPStatus, message: str) -> None:  # noqa: D102
+        self.respond(status, json.dumps({"error": message}).encode("utf8"))
+
+    def respond(self, status: HTTPStatus, body: bytes) -> None:  # noqa: D102
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+if __name__ == "__main__":
+    import argparse
+    import contextlib
+    from pathlib import Path
+
+    from table_stats import stats_sources
+
+    parser = argparse.ArgumentParser(prog="server.py", description="Serve the stats as JSON over HTTP")
+    parser.add_argument("stats_xml", nargs="+", help="Path to Stats.xml, several as NAME=PATH like main.py")
+    parser.add_argument("song_listing_csv", help="Path to file generated by getavailablesongs.py")
+    parser.add_argument("--upload-folder", help="Path to the Save/Upload folder (for the play history analyzers)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--cache-entries", type=int, default=256, help="Number of query results to keep")
+    parser.add_argument("--watch-interval", type=float, default=0.25, help="How often to check the input files")
+    args = parser.parse_args()
+
+    try:
+        sources = stats_sources(args.stats_xml)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print("Loading input files...")
+    upload_folder = Path(args.upload_folder) if args.upload_folder else None
+    server = StatsServer(
+        (args.host, args.port),
+        ReportWatcher(sources, Path(args.song_listing_csv), upload_folder),
+        cache_entries=args.cache_entries,
+    )
+    threading.Thread(target=server.watch, args=(args.watch_interval,), daemon=True).start()
+    print(f"Serving on http://{args.host}:{args.port}/analyzers (Ctrl+C to stop)")
+    with contextlib.suppress(KeyboardInterrupt):
+        server.serve_forever()
@@ -0,0 +1,113 @@
+"""
+Reading and writing the song listing generated by getavailablesongs.py.
+
+The listing is one row per chart: (key, song, steptype, difficulty, meter).
+It's stored as a headerless CSV by default, or in a columnar format (Parquet/Feather, needs pyarrow)
+where key/steptype/difficulty are dictionary encoded, so a big listing loads straight into pandas.
+pandas is only imported when a columnar file is touched, to keep the scanner light.
+"""
+
+import csv
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+COLUMNS = ["key", "song", "steptype", "difficulty", "meter"]
+FORMATS = ["csv", "parquet", "feather"]
+
+# columns stored as dictionary-encoded (categorical) columns in columnar files
+DICTIONARY_COLUMNS = ["key", "steptype", "difficulty"]
+
+# leading bytes used to detect the file format, anything else is assumed to be CSV
+MAGIC_BYTES = {
+    b"PAR1": "parquet",
+    b"ARROW1": "feather",  # feather v2 = Arrow IPC file
+    b"FEA1": "feather",  # legacy feather v1
+}
+
+
+def detect_format(path: Path) -> str:
+    """Figure out the format of a song listing file from its first few bytes."""
+    with open(path, "rb") as f:
+        head = f.read(8)
+    for magic, fmt in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return fmt
+    return "csv"
+
+
+def suffix_for(fmt: str) -> str:
+    """Return the default file extension for a listing format"""
+    return {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}[fmt]
+
+
+def _require_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "Parquet/Feather song listings need pyarrow, install it with `pip install .[columnar]`"
+        ) from e
+
+
+def read_columnar(path: Path, fmt: str) -> "pd.DataFrame":
+    """
+    Load a Parquet/Feather song listing as a DataFrame with columns `COLUMNS`.
+    Dictionary-encoded columns come back as pandas categoricals.
+    """
+    import pandas as pd
+
+    _require_pyarrow()
+    if fmt == "parquet":
+        return pd.read_parquet(path)[COLUMNS]
+    if fmt == "feather":
+        return pd.read_feather(path)[COLUMNS]
+    raise ValueError(f"not a columnar listing format: {fmt}")
+
+
+def read_csv(path: Path) -> "pd.DataFrame":
+    """Load a CSV song listing as a DataFrame with columns `COLUMNS`."""
+    import pandas as pd
+
+    dtypes = {"key": str, "song": str, "steptype": str, "difficulty": str, "meter": "int64"}
+    try:
+        # na_filter=False: song titles like "NA" or "" should stay strings
+        return pd.read_csv(path, header=None, names=COLUMNS, dtype=dtypes, na_filter=False, encoding="utf8")
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+
+
+def read_frame(path: Path) -> "pd.DataFrame":
+    """
+    Load a song listing in any format as a DataFrame with columns `COLUMNS`.
+    Columns from columnar files may be categorical.
+    """
+    fmt = detect_format(path)
+    if fmt == "csv":
+        return read_csv(path)
+    return read_columnar(path, fmt)
+
+
+def read_rows(path: Path) -> list[list]:
+    """Load a song listing in any format as a list of [key, song, steptype, difficulty, meter] rows."""
+    fmt = detect_format(path)
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf8") as csvfile:
+            reader = csv.reader(csvfile, delimiter=",", quotechar='"')
+            return [row for row in reader]
+    return read_columnar(path, fmt).astype(object).values.tolist()
+
+
+def convert_csv(csv_path: Path, dest_path: Path, fmt: str) -> None:
+    """Convert a CSV song listing to a columnar format."""
+    _require_pyarrow()
+    df = read_csv(csv_path)
+    df = df.astype({column: "category" for column in DICTIONARY_COLUMNS})
+    if fmt == "parquet":
+        df.to_parquet(dest_path, index=False)
+    elif fmt == "feather":
+        df.to_feather(dest_path)
+    else:
+        raise ValueError(f"not a columnar listing format: {fmt}")
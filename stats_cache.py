@@ -0,0 +1,271 @@
+"""
+On-disk cache of parsed TableStats data, so runs on unchanged input files skip parsing entirely.
+
+Wraps the TableStats loaders: each loader's output frames are pickled into the cache directory
+under a key made from the input file (path, size, mtime, content hash) and the loader options.
+The derived `combined`/`pack_info` tables are cached too, keyed on both inputs.
+Stats.xml is different: it changes after every session, so its entry is kept per file and loader options
+and holds the last load, which the next one is patched from (see stats_delta.py).
+The Save/Upload folder works the same way, its entry holds the last load and the files it read (see upload_data.py).
+Least recently used entries are evicted once the cache grows over its size limit.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+import stats_delta
+import upload_data
+from profiling import add_rows, timed
+from table_stats import TableStats
+
+# bump this whenever the loaders change what they produce, to invalidate old entries
+CACHE_VERSION = 4
+
+
+def file_digest(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Content hash of a (possibly large) file"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def reload_stats_xml(
+    path_to_stats: Path, previous: Optional[stats_delta.StatsXmlState], options: dict
+) -> stats_delta.StatsXmlState:
+    """
+    Load a Stats.xml, patching the previous load of it (see stats_delta.py).
+    (Top-level function so it can be shipped off to worker processes.)
+    """
+    return stats_delta.fill_stats_xml(TableStats(), path_to_stats, previous, **options)
+
+
+class TableStatsCache:
+    """
+    Cache layer around TableStats.fill_stats_xml/fill_song_listing.
+
+    >>> cache = TableStatsCache(Path(".cache"))
+    >>> cache.fill_stats_xml(stats, Path("Stats.xml"))
+    >>> cache.fill_song_listing(stats, Path("song_listing.csv"))
+    >>> cache.fill_derived(stats)
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 1 << 30) -> None:
+        """max_bytes: Evict old entries once the cache directory grows past this size."""
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # keys of the inputs loaded so far, used to key the derived tables
+        self.input_keys: dict[str, str] = {}
+        # how the last Stats.xml load went, if it wasn't straight from the cache
+        self.stats_state: Optional[stats_delta.StatsXmlState] = None
+        # same for each file of the last multi-file load
+        self.stats_states: dict[str, stats_delta.StatsXmlState] = {}
+        # how the last upload folder load went
+        self.upload_state: Optional[upload_data.UploadState] = None
+
+    def key(self, loader: str, path: Path, options: dict[str, Any], contents: bool = True) -> str:
+        """
+        Cache key for the output of `loader` run on `path` with `options`.
+        contents: Whether the key should change when the file does.
+        """
+        description = {
+            "version": CACHE_VERSION,
+            "loader": loader,
+            "path": str(path.resolve()),
+            # sets aren't JSON-able (or ordered)
+            "options": {k: sorted(v) if isinstance(v, (set, frozenset)) else v for k, v in options.items()},
+        }
+        if contents:
+            stat = path.stat()
+            description.update(size=stat.st_size, mtime=stat.st_mtime_ns, hash=file_digest(path))
+        return hashlib.sha1(json.dumps(description, sort_keys=True).encode("utf8")).hexdigest()
+
+    def entry_path(self, name: str, key: str) -> Path:  # noqa: D102
+        return self.cache_dir / f"{name}-{key}.pickle"
+
+    def get(self, name: str, key: str) -> Optional[dict]:
+        """Load a cache entry, or None if it's not there (or unreadable)."""
+        path = self.entry_path(name, key)
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        # mark as recently used, for eviction
+        os.utime(path)
+        return data
+
+    def put(self, name: str, key: str, data: dict) -> None:
+        """Store a cache entry, then trim the cache down to size."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.entry_path(name, key)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = [(p.stat(), p) for p in self.cache_dir.glob("*.pickle")]
+        entries.sort(key=lambda e: e[0].st_mtime_ns, reverse=True)
+        total = 0
+        for stat, path in entries:
+            total += stat.st_size
+            if total > self.max_bytes:
+                path.unlink(missing_ok=True)
+
+    @timed()
+    def fill_stats_xml(self, stats: TableStats, path_to_stats: Path, **options: Any) -> bool:  # noqa: ANN401
+        """
+        Load Stats.xml data into `stats` through the cache, options as for TableStats.fill_stats_xml.
+        If the file changed since it was last loaded, only the songs that changed are parsed (see stats_delta.py),
+        `stats_state` tells how many.
+        Returns whether the data came from the cache.
+        """
+        key, entry_key, data = self.stats_entry(path_to_stats, options)
+        self.input_keys["stats"] = key
+        if data is not None and data["key"] == key:
+            self.stats_state = None
+            stats.playedsongs = data["state"].playedsongs
+            stats.highscores = data["state"].highscores
+            add_rows(len(stats.playedsongs) + len(stats.highscores))
+            return True
+
+        previous = data["state"] if data is not None else None
+        self.stats_state = stats_delta.fill_stats_xml(stats, path_to_stats, previous, **options)
+        self.put("stats", entry_key, {"key": key, "state": self.stats_state})
+        return False
+
+    def stats_entry(self, path_to_stats: Path, options: dict[str, Any]) -> tuple[str, str, Optional[dict]]:
+        """
+        Look up the cache entry for a Stats.xml, there's one per file (and options) holding its last load.
+        Returns (key of the file's current contents, key of the entry, entry or None).
+        The entry is up to date if its "key" is the first key.
+        """
+        entry_key = self.key("stats", path_to_stats, options, contents=False)
+        return self.key("stats", path_to_stats, options), entry_key, self.get("stats", entry_key)
+
+    @timed()
+    def fill_stats_xmls(
+        self,
+        stats: TableStats,
+        sources: Mapping[str, Path],
+        jobs: Optional[int] = None,
+        **options: Any,  # noqa: ANN401
+    ) -> dict[str, bool]:
+        """
+        Load several Stats.xml files into `stats` through the cache, like TableStats.fill_stats_xmls.
+        Files that changed since they were last loaded are patched (see stats_delta.py) in parallel,
+        in up to `jobs` worker processes. `stats_states` tells how that went for each of them.
+        Returns whether each file's data came from the cache.
+        """
+        keys = {}
+        tables = {}
+        pending = {}  # source -> (entry key, previous load)
+        for source, path in sources.items():
+            keys[source], entry_key, data = self.stats_entry(path, options)
+            if data is not None and data["key"] == keys[source]:
+                tables[source] = (data["state"].playedsongs, data["state"].highscores)
+            else:
+                pending[source] = (entry_key, data["state"] if data is not None else None)
+
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        jobs = min(jobs, len(pending))
+        if jobs <= 1:
+            states = {
+                source: reload_stats_xml(sources[source], previous, options)
+                for source, (_, previous) in pending.items()
+            }
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = {
+                    source: pool.submit(reload_stats_xml, sources[source], previous, options)
+                    for source, (_, previous) in pending.items()
+                }
+                states = {source: future.result() for source, future in futures.items()}
+
+        self.stats_states = states
+        for source, state in states.items():
+            self.put("stats", pending[source][0], {"key": keys[source], "state": state})
+            tables[source] = (state.playedsongs, state.highscores)
+
+        stats.merge_stats_sources({source: tables[source] for source in sources})
+        self.input_keys["stats"] = hashlib.sha1(json.dumps(list(keys.items())).encode("utf8")).hexdigest()
+        return {source: source not in pending for source in sources}
+
+    @timed()
+    def fill_upload_data(
+        self,
+        stats: TableStats,
+        path_to_upload: Path,
+        jobs: Optional[int] = None,
+        **options: Any,  # noqa: ANN401
+    ) -> bool:
+        """
+        Load the Save/Upload folder into `stats` through the cache, options as for upload_data.fill_upload_data.
+        Only upload files that weren't there when the folder was last loaded are read, `upload_state` tells how many.
+        Returns whether the data came from the cache (no new files).
+        """
+        entry_key = self.key("upload", path_to_upload, options, contents=False)
+        data = self.get("upload", entry_key)
+        previous = data["state"] if data is not None else None
+        self.upload_state = upload_data.fill_upload_data(stats, path_to_upload, previous, jobs=jobs, **options)
+        unchanged = (
+            previous is not None
+            and self.upload_state.parsed == 0
+            and self.upload_state.files.keys() == previous.files.keys()
+        )
+        if not unchanged:
+            self.put("upload", entry_key, {"state": self.upload_state})
+        return unchanged
+
+    @timed()
+    def fill_song_listing(self, stats: TableStats, path_to_csv: Path, **options: Any) -> bool:  # noqa: ANN401
+        """
+        Load song listing data into `stats` through the cache, options as for TableStats.fill_song_listing.
+        Returns whether the data came from the cache.
+        """
+        if not path_to_csv.exists():
+            # let the loader deal with (and complain about) the missing file
+            self.input_keys["listing"] = "missing"
+            stats.fill_song_listing(path_to_csv, **options)
+            return False
+
+        key = self.input_keys["listing"] = self.key("listing", path_to_csv, options)
+        data = self.get("listing", key)
+        if data is not None:
+            stats.availablesongs = data["availablesongs"]
+            add_rows(len(stats.availablesongs))
+            return True
+
+        stats.fill_song_listing(path_to_csv, **options)
+        self.put("listing", key, {"availablesongs": stats.availablesongs})
+        return False
+
+    @timed()
+    def fill_derived(self, stats: TableStats) -> bool:
+        """
+        Fill the `combined` and `pack_info` tables of `stats`, from the cache if they were computed
+        for the same inputs before (computing and caching them otherwise).
+        Call after loading both the Stats.xml and the song listing through this cache.
+        Returns whether the data came from the cache.
+        """
+        key = hashlib.sha1(f"{self.input_keys['stats']}-{self.input_keys['listing']}".encode()).hexdigest()
+        data = self.get("derived", key)
+        if data is not None:
+            # these are cached properties, which store their value in the instance dict
+            stats.__dict__["combined"] = data["combined"]
+            stats.__dict__["pack_info"] = data["pack_info"]
+            return True
+
+        self.put("derived", key, {"combined": stats.combined, "pack_info": stats.pack_info})
+        return False
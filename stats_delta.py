@@ -0,0 +1,215 @@
+"""
+Incremental reloading of Stats.xml.
+
+StepMania rewrites all of Stats.xml after every session, but only the songs played in that session change.
+Instead of parsing years of history again, the `SongScores` section is split into the raw text of each
+`<Song>` block, which is fingerprinted. Rows from blocks that were already there in the previous load
+are copied over from the previous tables, and only new or changed blocks get parsed.
+(A new play changes NumTimesPlayed and LastPlayed, a new score adds a HighScore: either changes the text.)
+
+The previous load is described by a StatsXmlState, which the caller keeps around (see stats_cache.py).
+If the file isn't laid out the way StepMania writes it, the delta can't be trusted and the whole file is
+reloaded with TableStats.fill_stats_xml instead.
+
+>>> state = fill_stats_xml(stats, Path("Stats.xml"))  # full load
+>>> ...  # another session is played
+>>> state = fill_stats_xml(stats, Path("Stats.xml"), previous=state)  # only parses what changed
+"""
+
+import hashlib
+import re
+import xml.etree.ElementTree as ET
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from profiling import add_rows, timed
+from table_stats import TableStats, song_score_rows, stats_frames
+
+SONG_SCORES_START = b"<SongScores>"
+SONG_SCORES_END = b"</SongScores>"
+SONG_END = b"</Song>"
+WHITESPACE = re.compile(rb"\s*")
+ENCODING = re.compile(rb"""encoding=["']([\w.-]+)["']""")
+
+
+class UnexpectedLayoutError(Exception):
+    """Stats.xml isn't laid out the way StepMania writes it, so it can't be split into songs safely."""
+
+
+def iter_song_blocks(path: Path, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    """
+    Stream the raw text of every `<Song>...</Song>` block in the `SongScores` section of a Stats.xml file.
+    Raises UnexpectedLayoutError when that can't be done by just looking for the tags:
+    anything but whitespace between songs, other encodings than UTF-8, DTDs (which could define entities).
+    """
+    with open(path, "rb") as f:
+        buf = b""
+        pos = 0
+
+        def more() -> bool:
+            """Read the next chunk of the file into the buffer, dropping what's been used"""
+            nonlocal buf, pos
+            chunk = f.read(chunk_size)
+            buf = buf[pos:] + chunk
+            pos = 0
+            return bool(chunk)
+
+        while (start := buf.find(SONG_SCORES_START)) == -1:
+            if not more():
+                raise UnexpectedLayoutError("no SongScores section")
+        header = buf[:start]
+        if b"<!DOCTYPE" in header:
+            raise UnexpectedLayoutError("has a DTD")
+        if (encoding := ENCODING.search(header)) and encoding.group(1).lower() not in (b"utf-8", b"utf8"):
+            raise UnexpectedLayoutError(f"encoded in {encoding.group(1).decode()}")
+        pos = start + len(SONG_SCORES_START)
+
+        while True:
+            pos = WHITESPACE.match(buf, pos).end()
+            # make sure there's enough in the buffer to tell what comes next
+            while len(buf) - pos < len(SONG_SCORES_END):
+                if not more():
+                    raise UnexpectedLayoutError("SongScores isn't closed")
+                pos = WHITESPACE.match(buf, pos).end()
+
+            if buf.startswith(SONG_SCORES_END, pos):
+                return
+            if not (buf.startswith(b"<Song ", pos) or buf.startswith(b"<Song>", pos)):
+                raise UnexpectedLayoutError(f"unexpected {buf[pos:pos + 20]!r} in SongScores")
+            while (end := buf.find(SONG_END, pos)) == -1:
+                if not more():
+                    raise UnexpectedLayoutError("Song isn't closed")
+            end += len(SONG_END)
+            yield buf[pos:end]
+            pos = end
+
+
+def fingerprint(block: bytes) -> bytes:  # noqa: D103
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+@dataclass
+class StatsXmlState:
+    """
+    Result of loading a Stats.xml, with what's needed to reload it incrementally:
+    the fingerprint of every `Song` block (in file order) and the block each table row came from.
+    If the file couldn't be split into blocks, `fingerprints` is None and the next load will be a full one.
+    """
+
+    options: dict[str, Any]
+    playedsongs: pd.DataFrame
+    highscores: pd.DataFrame
+    fingerprints: Optional[list[bytes]] = None
+    playedsongs_block: Optional[np.ndarray] = None
+    highscores_block: Optional[np.ndarray] = None
+    # song blocks parsed in this load (all of them for a full load), None if the file couldn't be split
+    parsed: Optional[int] = None
+
+    @property
+    def incremental(self) -> bool:
+        """Whether this load reused anything from the previous one"""
+        return self.parsed is not None and self.parsed < len(self.fingerprints)
+
+    def summary(self) -> str:
+        """How the load went, for the user"""
+        if self.incremental:
+            return f"updated since the last run: {self.parsed} of {len(self.fingerprints)} songs changed"
+        return "loaded"
+
+
+def loader_options(
+    packs_to_ignore: Optional[set[str]] = None, track_usb_customs: bool = False, track_slowed_down_plays: bool = False
+) -> dict[str, Any]:
+    """Options for TableStats.fill_stats_xml with the defaults filled in, so they can be compared"""
+    return {
+        "packs_to_ignore": set(packs_to_ignore or ()),
+        "track_usb_customs": track_usb_customs,
+        "track_slowed_down_plays": track_slowed_down_plays,
+    }
+
+
+def merge(
+    old: pd.DataFrame, old_block: np.ndarray, block_map: np.ndarray, new: pd.DataFrame, new_block: np.ndarray
+) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Rows of the `old` table from blocks still in the file (block_map: old block -> new block, -1 if gone)
+    plus the `new` rows, put back in file order. Returns the table and the (new) block of every row.
+    """
+    moved = block_map[old_block]
+    kept = moved >= 0
+    parts = [(old.iloc[np.flatnonzero(kept)], moved[kept]), (new, new_block)]
+    # empty tables don't have the right dtypes, leave them out so they don't spoil the others
+    parts = [(df, block) for df, block in parts if len(df)] or [(new, new_block)]
+    df = pd.concat([df for df, _ in parts]) if len(parts) > 1 else parts[0][0]
+    block = np.concatenate([block for _, block in parts])
+    # rows within a block keep their order (stable sort)
+    order = np.argsort(block, kind="stable")
+    return df.iloc[order], block[order]
+
+
+@timed()
+def fill_stats_xml(
+    stats: TableStats,
+    path_to_stats: Path,
+    previous: Optional[StatsXmlState] = None,
+    **options: Any,  # noqa: ANN401
+) -> StatsXmlState:
+    """
+    Fill `stats` with data from Stats.xml just like TableStats.fill_stats_xml (same options, same tables),
+    but only parse the songs that changed since the load `previous` came from.
+    Returns the state to pass as `previous` next time.
+    """
+    options = loader_options(**options)
+    if previous is not None and (previous.options != options or previous.fingerprints is None):
+        previous = None
+    known = {fp: i for i, fp in enumerate(previous.fingerprints)} if previous is not None else {}
+
+    fingerprints = []
+    # old block -> new block
+    block_map = np.full(len(previous.fingerprints) if previous is not None else 0, -1, dtype=np.int64)
+    playdata, leaderboards = [], []
+    playdata_block, leaderboards_block = [], []
+    try:
+        for n, block in enumerate(iter_song_blocks(path_to_stats)):
+            fp = fingerprint(block)
+            old = known.pop(fp, None)  # (popped: an identical block showing up twice gets parsed the second time)
+            fingerprints.append(fp)
+            if old is not None:
+                block_map[old] = n
+                continue
+
+            song_playdata, song_leaderboards = song_score_rows(ET.fromstring(block), **options)
+            playdata += song_playdata
+            leaderboards += song_leaderboards
+            playdata_block += [n] * len(song_playdata)
+            leaderboards_block += [n] * len(song_leaderboards)
+    except (UnexpectedLayoutError, ET.ParseError):
+        # can't trust the split, do it the slow way (which also complains properly if the file is broken)
+        stats.fill_stats_xml(path_to_stats, **options)
+        return StatsXmlState(options, stats.playedsongs, stats.highscores)
+
+    df_playdata, df_leaderboards = stats_frames(playdata, leaderboards)
+    playdata_block = np.array(playdata_block, dtype=np.int64)
+    leaderboards_block = np.array(leaderboards_block, dtype=np.int64)
+    if previous is not None:
+        df_playdata, playdata_block = merge(
+            previous.playedsongs, previous.playedsongs_block, block_map, df_playdata, playdata_block
+        )
+        df_leaderboards, leaderboards_block = merge(
+            previous.highscores, previous.highscores_block, block_map, df_leaderboards, leaderboards_block
+        )
+        # the categories have to come out the same as a full load would make them
+        df_leaderboards = df_leaderboards.assign(player=df_leaderboards["player"].astype(object).astype("category"))
+
+    add_rows(len(playdata) + len(leaderboards))
+    stats.playedsongs = df_playdata
+    stats.highscores = df_leaderboards
+    parsed = len(fingerprints) - int((block_map >= 0).sum())
+    return StatsXmlState(
+        options, df_playdata, df_leaderboards, fingerprints, playdata_block, leaderboards_block, parsed=parsed
+    )
@@ -0,0 +1,365 @@
+# Generate realistic fake cab data: a Stats.xml, the matching song listing and (optionally) Songs and Upload folders,
+# at whatever size is needed, so performance can be measured without a real cab's files.
+# usage: synthetic.py (output folder) [options], see --help
+
+import argparse
+import csv
+import random
+from collections import namedtuple
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+Chart = namedtuple("Chart", ("steptype", "difficulty", "meter"))
+Song = namedtuple("Song", ("pack", "folder", "title", "charts", "listed", "popularity"))
+
+# (difficulty, lowest meter, highest meter, chance a song has it)
+SPREAD = [
+    ("Beginner", 1, 3, 0.6),
+    ("Easy", 2, 6, 0.95),
+    ("Medium", 5, 9, 0.95),
+    ("Hard", 8, 13, 0.95),
+    ("Challenge", 11, 19, 0.8),
+]
+DDR_PACKS = ["DDR A", "DDR A20", "DanceDanceRevolution X", "DDR 2014", "DanceDanceRevolution SuperNOVA"]
+# mostly plain titles, plus the kinds that have caused trouble: commas, quotes, non-ASCII, "NA", blank
+TITLES = ["Song {}"] * 20 + ["Title, with comma {}", '"Quoted" {}', "Sōng {}", "曲 {}", "NA", ""]
+ARROWS = ["1000", "0100", "0010", "0001", "0000", "0000", "1001", "0110"]
+
+
+@dataclass
+class CabConfig:
+    """Shape of the generated data. The defaults are a mid-sized cab, around 14k charts and 24k scores."""
+
+    packs: int = 60
+    songs_per_pack: int = 30
+    # chance of a song having doubles charts / 1-3 edits / a non-dance (pump) chart
+    doubles_share: float = 0.7
+    edit_share: float = 0.1
+    pump_share: float = 0.02
+    # packs named like official DDR releases, which some sheets treat differently
+    ddr_packs: int = 3
+    # share of charts that have been played, and the average playcount of a played chart
+    # (popular packs and songs get far more plays than the rest)
+    played_share: float = 0.4
+    mean_plays: float = 6.0
+    # number of scores kept per chart, and number of different players setting them
+    leaderboard_depth: int = 10
+    players: int = 40
+    # share of scores set on a ratemod, half of them slowed down
+    ratemod_share: float = 0.1
+    # USB custom songs, recorded in the "@mem" pack
+    mem_songs: int = 20
+    # share of played songs that have since been removed from the cab (so not in the song listing)
+    removed_share: float = 0.02
+    # share of songs loaded from AdditionalSongs instead of Songs
+    additional_share: float = 0.1
+    # stages played in sessions recorded in a Save/Upload folder (0 for none), and how many are played by two players
+    upload_stages: int = 0
+    versus_share: float = 0.3
+    seed: int = 0
+
+
+def make_library(config: CabConfig) -> list[Song]:
+    """Make up every song on the cab (including removed songs and USB customs) with its charts."""
+    rnd = random.Random(config.seed)
+
+    def charts() -> list[Chart]:
+        steptypes = ["dance-single"]
+        if rnd.random() < config.doubles_share:
+            steptypes.append("dance-double")
+        if rnd.random() < config.pump_share:
+            steptypes.append("pump-single")
+        result = []
+        for steptype in steptypes:
+            result += [Chart(steptype, diff, rnd.randint(lo, hi)) for diff, lo, hi, p in SPREAD if rnd.random() < p]
+            if rnd.random() < config.edit_share:
+                result += [Chart(steptype, "Edit", rnd.randint(1, 30)) for _ in range(rnd.randint(1, 3))]
+        return result
+
+    ddr = min(config.ddr_packs, config.packs)
+    packs = [
+        DDR_PACKS[i % len(DDR_PACKS)] + (f" {i // len(DDR_PACKS) + 1}" if i >= len(DDR_PACKS) else "")
+        for i in range(ddr)
+    ]
+    packs += [f"Pack {i:04d}" for i in range(config.packs - ddr)]
+
+    library = []
+    for pack in packs:
+        pack_popularity = rnd.paretovariate(1.5)
+        for i in range(config.songs_per_pack):
+            title = rnd.choice(TITLES).format(i)
+            listed = rnd.random() >= config.removed_share
+            library.append(Song(pack, f"Song {i:03d}", title, charts(), listed, pack_popularity * rnd.paretovariate(2)))
+    for i in range(config.mem_songs):
+        library.append(Song("@mem", f"Custom {i:03d}", f"Custom {i}", charts(), False, rnd.paretovariate(2)))
+    return library
+
+
+def write_song_listing(library: list[Song], path: Path) -> int:
+    """Write the song listing getavailablesongs.py would make for the library, returns the number of charts."""
+    rows = [
+        (f"{song.pack}/{song.folder}/", song.title, *chart) for song in library if song.listed for chart in song.charts
+    ]
+    with open(path, "w", newline="", encoding="utf8") as f:
+        csv.writer(f, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL).writerows(rows)
+    return len(rows)
+
+
+def highscore_xml(rnd: random.Random, percent: float, name: str, when: datetime, ratemod_share: float) -> str:
+    """Make up a `HighScore` element, written the way StepMania writes it"""
+    taps = rnd.randint(100, 900)
+    mods = ["a550", "Overhead"]
+    if rnd.random() < ratemod_share:
+        mods.insert(1, rnd.choice(["0.8xMusic", "0.9xMusic", "1.2xMusic", "1.5xMusic"]))
+    return (
+        f"<HighScore><Name>{escape(name)}</Name><HighScoreGuid>{rnd.getrandbits(64):016x}</HighScoreGuid>"
+        f"<Grade>Tier{max(1, int((1 - percent) * 20)):02d}</Grade><Score>{int(percent * taps * 1000)}</Score>"
+        f"<PercentDP>{percent:.6f}</PercentDP><SurviveSeconds>{rnd.uniform(60, 150):.6f}</SurviveSeconds>"
+        f"<MaxCombo>{int(taps * percent)}</MaxCombo><StageAward></StageAward><PeakComboAward></PeakComboAward>"
+        f"<Modifiers>{', '.join(mods)}</Modifiers><DateTime>{when:%Y-%m-%d %H:%M:%S}</DateTime>"
+        "<PlayerGuid>0000000000000000</PlayerGuid><MachineGuid>0000000000000000</MachineGuid>"
+        f"<ProductID>1</ProductID><TapNoteScores><Miss>{int(taps * (1 - percent))}</Miss><W2>0</W2>"
+        f"<W1>{int(taps * percent)}</W1></TapNoteScores><HoldNoteScores><Held>0</Held></HoldNoteScores>"
+        "<LifeRemainingSeconds>0.000000</LifeRemainingSeconds><Disqualified>0</Disqualified></HighScore>"
+    )
+
+
+def make_players(rnd: random.Random, config: CabConfig) -> tuple[list[str], list[float]]:
+    """Names of the cab's players, and how often each one plays (a few regulars set most of the scores)"""
+    players = [
+        "".join(rnd.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789") for _ in range(4)) for _ in range(config.players)
+    ]
+    return players, [1 / (i + 1) for i in range(len(players))]
+
+
+def write_stats_xml(library: list[Song], path: Path, config: CabConfig) -> dict[str, int]:
+    """
+    Write a Stats.xml with plays and leaderboards for the library.
+    Returns counts of what was written: played charts, scores.
+    """
+    rnd = random.Random(f"{config.seed}-stats")
+    end = datetime(2024, 1, 1)
+    players, player_weights = make_players(rnd, config)
+    mean_popularity = sum(song.popularity for song in library) / max(len(library), 1)
+
+    def when(before: datetime) -> datetime:
+        return before - timedelta(seconds=rnd.randint(0, 3 * 365 * 86400))
+
+    played_charts = scores = 0
+    recent = []
+    with open(path, "w", encoding="utf8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8" ?>\n<Stats>\n')
+        f.write("<GeneralData><DisplayName>Synthetic Cab</DisplayName><LastPlayedMachineGuid>0</LastPlayedMachineGuid>")
+        f.write(f"<NumTotalSongsPlayed>0</NumTotalSongsPlayed><Guid>{rnd.getrandbits(64):016x}</Guid></GeneralData>\n")
+        f.write("<SongScores>\n")
+        for song in library:
+            plays = [c for c in song.charts if rnd.random() < config.played_share]
+            if not plays:
+                continue
+            folder = "AdditionalSongs" if rnd.random() < config.additional_share else "Songs"
+            f.write(f"<Song Dir={quoteattr(f'{folder}/{song.pack}/{song.folder}/')}>\n")
+            for chart in plays:
+                playcount = 1 + int(rnd.expovariate(1 / (config.mean_plays * song.popularity / mean_popularity)))
+                lastplayed = when(end)
+                description = " Description='edit'" if chart.difficulty == "Edit" else ""
+                f.write(f"<Steps Difficulty='{chart.difficulty}' StepsType='{chart.steptype}'{description}>")
+                f.write(f"<HighScoreList><NumTimesPlayed>{playcount}</NumTimesPlayed>")
+                f.write(f"<LastPlayed>{lastplayed:%Y-%m-%d}</LastPlayed><HighGrade>Tier02</HighGrade>")
+                # the game keeps the best scores, highest first
+                depth = min(config.leaderboard_depth, playcount)
+                chart_scores = [
+                    (min(1.0, rnd.betavariate(6, 1.2)), name, when(lastplayed))
+                    for name in rnd.choices(players, player_weights, k=depth)
+                ]
+                chart_scores = [
+                    highscore_xml(rnd, *score, config.ratemod_share) for score in sorted(chart_scores, reverse=True)
+                ]
+                f.write("".join(chart_scores))
+                f.write("</HighScoreList></Steps>\n")
+                played_charts += 1
+                scores += depth
+                if chart_scores and len(recent) < 20:
+                    recent.append((song, chart, chart_scores[0]))
+            f.write("</Song>\n")
+        f.write("</SongScores>\n<RecentSongScores>\n")
+        for song, chart, score in recent:
+            f.write(f"<HighScoreForASongAndSteps><Song Dir={quoteattr(f'Songs/{song.pack}/{song.folder}/')}/>")
+            f.write(f"<Steps Difficulty='{chart.difficulty}' StepsType='{chart.steptype}'/>")
+            f.write(f"{score}</HighScoreForASongAndSteps>\n")
+        f.write("</RecentSongScores>\n</Stats>\n")
+    return {"played_charts": played_charts, "scores": scores}
+
+
+def write_upload_folder(library: list[Song], folder: Path, config: CabConfig) -> int:
+    """
+    Write the Save/Upload files of `config.upload_stages` stages, played in sessions over three years,
+    one file per stage as StepMania does. Returns the number of plays written.
+    """
+    rnd = random.Random(f"{config.seed}-upload")
+    end = datetime(2024, 1, 1)
+    players, player_weights = make_players(rnd, config)
+    songs = [song for song in library if song.charts]
+    popularity = [song.popularity for song in songs]
+
+    # sessions of a handful of stages a couple of minutes apart
+    sessions = []
+    stages = 0
+    while stages < config.upload_stages:
+        length = min(rnd.randint(3, 15), config.upload_stages - stages)
+        sessions.append((end - timedelta(seconds=rnd.randint(0, 3 * 365 * 86400)), length))
+        stages += length
+    sessions.sort()
+
+    folder.mkdir(parents=True, exist_ok=True)
+    plays = 0
+    for start, length in sessions:
+        group = rnd.choices(players, player_weights, k=2 if rnd.random() < config.versus_share else 1)
+        when = start
+        for _ in range(length):
+            when += timedelta(seconds=rnd.randint(100, 200))
+            song = rnd.choices(songs, popularity)[0]
+            folder_name = "AdditionalSongs" if rnd.random() < config.additional_share else "Songs"
+            entries = []
+            for name in group:
+                chart = rnd.choice(song.charts)
+                entries.append(
+                    f"<HighScoreForASongAndSteps><Song Dir={quoteattr(f'{folder_name}/{song.pack}/{song.folder}/')}/>"
+                    f"<Steps Difficulty='{chart.difficulty}' StepsType='{chart.steptype}'/>"
+                    f"{highscore_xml(rnd, min(1.0, rnd.betavariate(6, 1.2)), name, when, config.ratemod_share)}"
+                    "</HighScoreForASongAndSteps>\n"
+                )
+            with open(folder / f"{when:%Y-%m-%d} {plays:08d}.xml", "w", encoding="utf8") as f:
+                f.write(
+                    '<?xml version="1.0" encoding="UTF-8" ?>\n<Stats>\n<MachineGuid>0000000000000000</MachineGuid>\n'
+                )
+                f.write(f"<RecentSongScores>\n{''.join(entries)}</RecentSongScores>\n</Stats>\n")
+            plays += len(entries)
+    return plays
+
+
+def simfile_text(title: str, charts: list[Chart], ssc: bool, notes: Callable[[], str]) -> str:
+    """Text of a .sm or .ssc simfile with the given charts, notes() makes up each chart's note data."""
+    header = f"#TITLE:{title};\n#SUBTITLE:;\n#ARTIST:Artist;\n#TITLETRANSLIT:;\n#BPMS:0.000=150.000;\n"
+    if not ssc:
+        return header + "".join(
+            f"//---------------{st} - ----------------\n"
+            f"#NOTES:\n     {st}:\n     :\n     {diff}:\n     {meter}:\n     0,0,0,0,0:\n{notes()}\n;\n"
+            for st, diff, meter in charts
+        )
+    return (
+        "#VERSION:0.83;\n"
+        + header
+        + "".join(
+            f"#NOTEDATA:;\n#STEPSTYPE:{st};\n#DESCRIPTION:;\n#DIFFICULTY:{diff};\n#METER:{meter};\n"
+            f"#RADARVALUES:0,0,0,0,0;\n#NOTES:\n{notes()}\n;\n"
+            for st, diff, meter in charts
+        )
+    )
+
+
+def random_notes(rnd: random.Random, measures: int) -> Callable[[], str]:
+    """Note data maker for simfile_text(): `measures` measures of random arrows"""
+    return lambda: "\n,\n".join("\n".join(rnd.choice(ARROWS) for _ in range(8)) for _ in range(measures))
+
+
+def write_simfiles(library: list[Song], songs_folder: Path, measures: int = 4, seed: int = 0) -> None:
+    """
+    Write a Songs folder with a simfile for every listed song in the library, half .sm and half .ssc,
+    so that scanning it with getavailablesongs.py gives the same listing as write_song_listing().
+    """
+    rnd = random.Random(seed)
+    notes = random_notes(rnd, measures)
+    for i, song in enumerate(s for s in library if s.listed):
+        song_folder = songs_folder / song.pack / song.folder
+        song_folder.mkdir(parents=True, exist_ok=True)
+        ssc = i % 2 == 1
+        path = song_folder / ("song.ssc" if ssc else "song.sm")
+        path.write_text(simfile_text(song.title, song.charts, ssc, notes), encoding="utf8")
+
+
+def write_synthetic_pack(pack_folder: Path, songs: int = 100, measures: int = 120, seed: int = 0) -> None:
+    """
+    Write a pack of simfiles to pack_folder, half .sm and half .ssc.
+    Every song gets a singles and doubles spread (5 difficulties each) with `measures` measures of notes per chart.
+    """
+    notes = random_notes(random.Random(seed), measures)
+    charts = [
+        Chart(steptype, difficulty, meter)
+        for steptype in ("dance-single", "dance-double")
+        for difficulty, meter in zip(("Beginner", "Easy", "Medium", "Hard", "Challenge"), (1, 4, 7, 10, 13))
+    ]
+    for i in range(songs):
+        song_folder = pack_folder / f"Song {i:04d}"
+        song_folder.mkdir(parents=True, exist_ok=True)
+        ssc = i % 2 == 1
+        path = song_folder / ("song.ssc" if ssc else "song.sm")
+        path.write_text(simfile_text(f"Song {i}", charts, ssc, notes), encoding="utf8")
+
+
+def write_synthetic_listing(path: Path, rows: int = 500_000, seed: int = 0) -> None:
+    """
+    Write a CSV song listing (as generated by getavailablesongs.py) with roughly `rows` charts.
+    Includes the awkward bits: songs with several Edit charts, quoted/empty/"NA" titles, non-dance steptypes.
+    """
+    rnd = random.Random(seed)
+    spread = [("Beginner", 1), ("Easy", 4), ("Medium", 7), ("Hard", 10), ("Challenge", 13)]
+    titles = ["Song {}", "Title, with comma {}", '"Quoted" {}', "", "NA", "Sōng {}"]
+
+    with open(path, "w", newline="", encoding="utf8") as f:
+        writer = csv.writer(f)
+        written = song = 0
+        while written < rows:
+            key = f"Pack {song // 50:04d}/Song {song % 50:02d}/"
+            title = rnd.choice(titles).format(song)
+            for steptype in ("dance-single", "dance-double") + (("pump-single",) if rnd.random() < 0.05 else ()):
+                charts = [(diff, meter + rnd.randint(0, 3)) for diff, meter in spread if rnd.random() < 0.9]
+                charts += [("Edit", rnd.randint(1, 30)) for _ in range(rnd.choice([0, 0, 0, 1, 2, 3]))]
+                writer.writerows((key, title, steptype, diff, meter) for diff, meter in charts)
+                written += len(charts)
+            song += 1
+
+
+def write_cab(config: CabConfig, folder: Path, simfiles: bool = False) -> dict[str, int]:
+    """
+    Write `Stats.xml` and `song_listing.csv` (and a `Songs` folder, if `simfiles`, and an `Upload` folder,
+    if the config has upload stages) for a made-up cab to folder.
+    Returns counts of what was generated.
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    library = make_library(config)
+    counts = {"songs": len(library), "charts": sum(len(song.charts) for song in library)}
+    counts["listed_charts"] = write_song_listing(library, folder / "song_listing.csv")
+    counts.update(write_stats_xml(library, folder / "Stats.xml", config))
+    if config.upload_stages:
+        counts["upload_plays"] = write_upload_folder(library, folder / "Upload", config)
+    if simfiles:
+        write_simfiles(library, folder / "Songs", seed=config.seed)
+    return counts
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add an option for every CabConfig field to a command-line parser"""
+    group = parser.add_argument_group("generated data (see CabConfig in synthetic.py)")
+    for name, default in asdict(CabConfig()).items():
+        group.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default, help=f"({default})")
+
+
+def config_from_arguments(args: argparse.Namespace) -> CabConfig:
+    """CabConfig from options added by add_config_arguments()"""
+    return CabConfig(**{name: getattr(args, name) for name in asdict(CabConfig())})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="synthetic.py", description="Generate a Stats.xml and song listing for a made-up cab."
+    )
+    parser.add_argument("output", help="Folder to write Stats.xml and song_listing.csv to.")
+    parser.add_argument("--simfiles", action="store_true", help="Also write a Songs folder with matching simfiles.")
+    add_config_arguments(parser)
+
+    args = parser.parse_args()
+    counts = write_cab(config_from_arguments(args), Path(args.output), simfiles=args.simfiles)
+    print(", ".join(f"{v} {k.replace('_', ' ')}" for k, v in counts.items()))
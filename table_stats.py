@@ -1,20 +1,231 @@
-import csv
+import os
 import xml.etree.ElementTree as ET
-from collections import Counter
-from dataclasses import dataclass
+from collections.abc import Callable, Hashable, Iterable, Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
 from functools import cached_property
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional, TypeVar
 
+import numpy as np
 import pandas as pd
 
 import constants
+import song_listing
+from profiling import add_rows, timed
+
+T = TypeVar("T")
+
+_CHARTS = {"playedsongs", "availablesongs"}
+_UPLOADS = {"uploaddata", "dailyplays"}
+# derived tables (cached properties, and memoized tables by the first part of their key)
+# -> the loaded tables they're computed from, see TableStats.invalidate()
+DERIVED_FROM: dict[str, set[str]] = {
+    "combined": _CHARTS,
+    "song_shorthand": _CHARTS,
+    "pack_info": _CHARTS,
+    "chart_flags": _CHARTS,
+    "highscore_flags": {*_CHARTS, "highscores"},
+    "song_data": _CHARTS,
+    "leaderboards": {*_CHARTS, "highscores"},
+    "pack_chart_cube": _CHARTS,
+    "pack_song_cube": _CHARTS,
+    "daily_plays": _UPLOADS,
+    "pack_daily_plays": _UPLOADS,
+    "period_plays": _UPLOADS,
+}
+
+
+def iter_song_scores(path_to_stats: Path) -> Iterator[ET.Element]:
+    """
+    Stream the `Stats/SongScores/Song` elements of a Stats.xml file, one at a time.
+
+    The file is read with `iterparse` and every element is cleared once it has been handed out
+    (other top-level sections like RecentSongScores are thrown away as soon as they finish),
+    so memory use stays flat no matter how large the profile gets.
+    Don't hold on to a yielded element after asking for the next one.
+    """
+    # chain of currently open elements: [Stats, SongScores, Song, ...]
+    parents: list[ET.Element] = []
+    for event, elem in ET.iterparse(path_to_stats, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            continue
+
+        parents.pop()
+        if len(parents) == 2 and parents[1].tag == "SongScores":
+            # finished a full <Song> block
+            yield elem
+            parents[1].clear()
+        elif len(parents) == 1:
+            # finished a top-level section (GeneralData, SongScores, RecentSongScores, ...)
+            parents[0].clear()
+
+
+def song_key(songdir: str) -> tuple[str, str]:
+    """
+    Song key (`pack/song/`) and pack name for a song directory from Stats.xml,
+    e.g. 'Songs/DDR A/DANCE ALL NIGHT (DDR EDITION)/'.
+    """
+    # deal with AdditionalSongs paths: normalize them to `pack/song/`
+    # (packs from AdditionalSongFolders will show as `AdditionalSongs/pack/song/` instead of `pack/song/`)
+    # solution(?): take only the last two segments of the path
+    # not sure if AdditionalSongs is the only case this will happen,
+    # but hopefully this handles anything else that might show up?
+    parts = songdir.strip("/").split("/")
+    *_, pack, songname = parts
+    return f"{pack}/{songname}/", pack
+
+
+def song_score_rows(
+    song: ET.Element, packs_to_ignore: set[str], track_usb_customs: bool, track_slowed_down_plays: bool
+) -> tuple[list[tuple], list[tuple]]:
+    """
+    Rows for the playedsongs and highscores tables from one `Song` element of Stats.xml,
+    options as for TableStats.fill_stats_xml. Build the tables from the rows with stats_frames().
+    """
+    playdata = []
+    leaderboards = []
+
+    songdir, pack = song_key(song.get("Dir"))
+
+    # ignore any specified packs
+    if pack in packs_to_ignore:
+        return playdata, leaderboards
+
+    # iterate over every (played) chart in the song
+    editcount = 0
+    for steps in song.findall("Steps"):
+        # grab chart identifiers: steptype and difficulty
+        steptype = steps.get("StepsType")  # dance-single, dance-double, ...
+        difficulty = steps.get("Difficulty")  # Beginner, Easy, Medium, Hard, Challenge, Edit, ...
+        # if there are multiple edits, give them unique names to make processing easier,
+        # "Edit", "Edit-1", "Edit-2", etc.
+        if difficulty == "Edit":
+            if editcount >= 1:
+                difficulty = f"{difficulty}-{editcount}"
+            editcount += 1
+
+        # grab playdata info
+        numplayed = int(steps.find("HighScoreList/NumTimesPlayed").text)
+        lastplayed = pd.Timestamp(steps.find("HighScoreList/LastPlayed").text)
+        playdata.append((songdir, steptype, difficulty, numplayed, lastplayed))
+
+        # grab leaderboard info
+        # ignore USB customs, if flag specified
+        if pack != "@mem" or track_usb_customs:
+            chart_lb = []
+            for score in steps.find("HighScoreList").findall("HighScore"):
+                # don't include any scores on slower ratemods, if flag specified
+                if not track_slowed_down_plays:
+                    modifiers = score.find("Modifiers").text
+                    if "xMusic" in modifiers:
+                        mods = modifiers.split(",")
+                        ratemod = next(i for i in mods if "xMusic" in i)
+                        ratemod = ratemod.strip().replace("xMusic", "")
+                        ratemod = float(ratemod)
+                        if ratemod < 1:
+                            continue
+
+                chart_lb.append(
+                    (
+                        score.find("Name").text,
+                        float(score.find("PercentDP").text),
+                        datetime.fromisoformat(score.find("DateTime").text),
+                    )
+                )
+
+            chart_lb.sort(key=lambda x: x[1], reverse=True)
+            for i, (name, dp, timestamp) in enumerate(chart_lb):
+                leaderboards.append((songdir, steptype, difficulty, i + 1, name, dp, timestamp))
+    return playdata, leaderboards
+
+
+def stats_frames(playdata: list[tuple], leaderboards: list[tuple]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Build the playedsongs and highscores tables from the rows of song_score_rows()"""
+    df_playdata = pd.DataFrame(playdata, columns=["key", "steptype", "difficulty", "playcount", "lastplayed"])
+    df_playdata = df_playdata.set_index(["key", "steptype", "difficulty"])
+
+    df_leaderboards = pd.DataFrame(
+        leaderboards, columns=["key", "steptype", "difficulty", "place", "player", "score", "timestamp"]
+    )
+    df_leaderboards = df_leaderboards.set_index(["key", "steptype", "difficulty"])
+    # a handful of players own every score, store their names once
+    df_leaderboards["player"] = df_leaderboards["player"].astype("category")
+    return df_playdata, df_leaderboards
+
+
+def parse_stats_xml(path_to_stats: Path, options: dict) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Load the playedsongs and highscores tables of one Stats.xml, options as for TableStats.fill_stats_xml.
+    (Top-level function so it can be shipped off to worker processes.)
+    """
+    stats = TableStats()
+    stats.fill_stats_xml(path_to_stats, **options)
+    return stats.playedsongs, stats.highscores
+
+
+def rank_leaderboards(highscores: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sort leaderboard entries by chart (in order of first appearance) and score (highest first),
+    and number the places on each chart again. Ties keep their order.
+    """
+    chart = highscores.groupby(level=[0, 1, 2], sort=False).ngroup().to_numpy()
+    order = np.lexsort((-highscores["score"].to_numpy(), chart))
+    highscores = highscores.iloc[order]
+    place = pd.Series(chart[order]).groupby(chart[order]).cumcount().to_numpy() + 1
+    return highscores.assign(place=place)
+
+
+def stats_sources(args: Iterable[str]) -> dict[str, Path]:
+    """
+    Name the Stats.xml files given on a command line, as NAME=PATH or just a path (which is then the name too).
+    Raises ValueError if a name is given twice.
+    """
+    sources = {}
+    for arg in args:
+        name, sep, path = arg.partition("=")
+        if not sep or Path(arg).exists():
+            name, path = arg, arg
+        if name in sources:
+            raise ValueError(f"Stats.xml name {name} given twice")
+        sources[name] = Path(path)
+    return sources
+
+
+def merge_stats_sources(
+    tables: Mapping[str, tuple[pd.DataFrame, pd.DataFrame]],
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Combine the (playedsongs, highscores) tables of several Stats.xml files, given as {source name: tables}.
+    Returns (playedsongs, highscores, playedsongs_by_source), see TableStats.fill_stats_xmls().
+    """
+    source_dtype = pd.CategoricalDtype(list(tables))
+
+    def with_source(df: pd.DataFrame, source: str) -> pd.DataFrame:
+        return df.assign(source=pd.Categorical([source] * len(df), dtype=source_dtype))
+
+    # empty tables don't have the right dtypes, leave them out so they don't spoil the others (unless all are)
+    played = [with_source(played, source) for source, (played, _) in tables.items()]
+    by_source = pd.concat([df for df in played if len(df)] or played[:1])
+    playedsongs = by_source.groupby(level=[0, 1, 2], sort=False).agg(
+        playcount=("playcount", "sum"), lastplayed=("lastplayed", "max")
+    )
+
+    scores = [with_source(scores, source) for source, (_, scores) in tables.items()]
+    highscores = pd.concat([df for df in scores if len(df)] or scores[:1])
+    # a score can be in more than one file, e.g. both the machine's and the player's profile
+    duplicate = highscores.reset_index().duplicated(["key", "steptype", "difficulty", "player", "score", "timestamp"])
+    highscores = rank_leaderboards(highscores[~duplicate.to_numpy()])
+    highscores["player"] = highscores["player"].astype(object).astype("category")
+    return playedsongs, highscores, by_source
 
 
 class TableStatsConstructing:
     """Mixin for TableStats to hold data parsing functions. (Bad programming practice?)"""
 
+    @timed("TableStats.fill_stats_xml")
     def fill_stats_xml(
         self,
         path_to_stats: Path,
@@ -51,121 +262,89 @@ class TableStatsConstructing:
         if packs_to_ignore is None:
             packs_to_ignore = set()
 
-        stats_xml = ET.parse(path_to_stats)
-        root = stats_xml.getroot()
-        songscores = root.find("SongScores")
-
+        # stream the file instead of ET.parse()-ing it whole, Stats.xml for a long-running cab can be huge
         playdata = []
         leaderboards = []
-        for song in songscores:
-            songdir = song.get("Dir")  # e.g. 'Songs/DDR A/DANCE ALL NIGHT (DDR EDITION)/'
-
-            # deal with AdditionalSongs paths: normalize them to `pack/song/`
-            # (packs from AdditionalSongFolders will show as `AdditionalSongs/pack/song/` instead of `pack/song/`)
-            # solution(?): take only the last two segments of the path
-            # not sure if AdditionalSongs is the only case this will happen,
-            # but hopefully this handles anything else that might show up?
-            parts = songdir.strip("/").split("/")
-            *_, pack, songname = parts
-            songdir = f"{pack}/{songname}/"
-
-            # ignore any specified packs
-            if pack in packs_to_ignore:
-                continue
-
-            # iterate over every (played) chart in the song
-            editcount = 0
-            for steps in song.findall("Steps"):
-                # grab chart identifiers: steptype and difficulty
-                steptype = steps.get("StepsType")  # dance-single, dance-double, ...
-                difficulty = steps.get("Difficulty")  # Beginner, Easy, Medium, Hard, Challenge, Edit, ...
-                # if there are multiple edits, give them unique names to make processing easier,
-                # "Edit", "Edit-1", "Edit-2", etc.
-                if difficulty == "Edit":
-                    if editcount >= 1:
-                        difficulty = f"{difficulty}-{editcount}"
-                    editcount += 1
-
-                # grab playdata info
-                numplayed = int(steps.find("HighScoreList/NumTimesPlayed").text)
-                lastplayed = pd.Timestamp(steps.find("HighScoreList/LastPlayed").text)
-                playdata.append((songdir, steptype, difficulty, numplayed, lastplayed))
-
-                # grab leaderboard info
-                # ignore USB customs, if flag specified
-                if pack != "@mem" or track_usb_customs:
-                    chart_lb = []
-                    for score in steps.find("HighScoreList").findall("HighScore"):
-                        # don't include any scores on slower ratemods, if flag specified
-                        if not track_slowed_down_plays:
-                            modifiers = score.find("Modifiers").text
-                            if "xMusic" in modifiers:
-                                mods = modifiers.split(",")
-                                ratemod = next(i for i in mods if "xMusic" in i)
-                                ratemod = ratemod.strip().replace("xMusic", "")
-                                ratemod = float(ratemod)
-                                if ratemod < 1:
-                                    continue
-
-                        chart_lb.append(
-                            (
-                                score.find("Name").text,
-                                float(score.find("PercentDP").text),
-                                datetime.fromisoformat(score.find("DateTime").text),
-                            )
-                        )
-
-                    chart_lb.sort(key=lambda x: x[1], reverse=True)
-                    for i, (name, dp, timestamp) in enumerate(chart_lb):
-                        leaderboards.append((songdir, steptype, difficulty, i + 1, name, dp, timestamp))
-
-        df_playdata = pd.DataFrame(playdata, columns=["key", "steptype", "difficulty", "playcount", "lastplayed"])
-        df_playdata = df_playdata.set_index(["key", "steptype", "difficulty"])
-
-        df_leaderboards = pd.DataFrame(
-            leaderboards, columns=["key", "steptype", "difficulty", "place", "player", "score", "timestamp"]
-        )
-        df_leaderboards = df_leaderboards.set_index(["key", "steptype", "difficulty"])
-
+        for song in iter_song_scores(path_to_stats):
+            song_playdata, song_leaderboards = song_score_rows(
+                song, packs_to_ignore, track_usb_customs, track_slowed_down_plays
+            )
+            playdata += song_playdata
+            leaderboards += song_leaderboards
+        df_playdata, df_leaderboards = stats_frames(playdata, leaderboards)
+
+        add_rows(len(df_playdata) + len(df_leaderboards))
         self.playedsongs = df_playdata
         self.highscores = df_leaderboards
 
+    @timed("TableStats.fill_stats_xmls")
+    def fill_stats_xmls(
+        self,
+        sources: Mapping[str, Path],
+        jobs: Optional[int] = None,
+        **options: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Fill data from several Stats.xml files (from different cabs, or player profiles), given as {source name: path}.
+        Options are as for fill_stats_xml(). The files are parsed in parallel, in up to `jobs` worker processes.
+
+        Charts get their playcounts added up over all the files and the latest of their lastplayed dates.
+        Leaderboards are merged and ranked again, with each score's source in a `source` column
+        (scores that show up in more than one file, e.g. in both the machine's and the player's profile,
+        are only counted once).
+        Playcounts for each source are kept in `playedsongs_by_source`, see only_source() to look at a single one.
+        """
+        if jobs is None:
+            jobs = min(len(sources), os.cpu_count() or 1)
+        if jobs <= 1:
+            tables = {source: parse_stats_xml(path, options) for source, path in sources.items()}
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = {source: pool.submit(parse_stats_xml, path, options) for source, path in sources.items()}
+                tables = {source: future.result() for source, future in futures.items()}
+        self.merge_stats_sources(tables)
+
+    def merge_stats_sources(self, tables: Mapping[str, tuple[pd.DataFrame, pd.DataFrame]]) -> None:
+        """Fill data from the (playedsongs, highscores) tables of several Stats.xml files, see fill_stats_xmls()."""
+        self.playedsongs, self.highscores, self.playedsongs_by_source = merge_stats_sources(tables)
+        add_rows(len(self.playedsongs_by_source) + len(self.highscores))
+
+    @timed("TableStats.fill_song_listing")
     def fill_song_listing(self, path_to_csv: Path, packs_to_ignore: Optional[set[str]] = None) -> None:
-        """Load data from the song listing data file."""
-
-        def loadfromcsv(path: Path) -> list:
-            with open(path, newline="", encoding="utf8") as csvfile:
-                reader = csv.reader(csvfile, delimiter=",", quotechar='"')
-                return [row for row in reader]
-
+        """
+        Load data from the song listing data file.
+        The file format (CSV, Parquet or Feather) is detected from the file contents, see song_listing.py.
+        """
         if packs_to_ignore is None:
             packs_to_ignore = set()
 
         try:
-            availablesongs = loadfromcsv(path_to_csv)
+            df = song_listing.read_frame(path_to_csv)
         except FileNotFoundError:
             print(f"Error: couldn't load {path_to_csv}. Report data may be incomplete")
-            availablesongs = []
-
-        data = []
-        encountered = Counter()
-        for row in availablesongs:
-            # implement IGNORED_PACKS list
-            pack, songname = row[0].strip("/").split("/")
-            if pack in packs_to_ignore:
-                continue
-
-            # if a duplicate difficulty is encountered, name it "Edit", "Edit-1", Edit-2", ...
-            key = (row[0], row[2], row[3])
-            if key in encountered:
-                row[3] = f"{row[3]}-{encountered[key]}"
-            row[4] = int(row[4])
-            encountered[key] += 1
-            data.append(row)
-
-        df_availablesongs = pd.DataFrame(data, columns=["key", "song", "steptype", "difficulty", "meter"])
-        df_availablesongs = df_availablesongs.set_index(["key", "steptype", "difficulty"])
+            df = pd.DataFrame({column: pd.Series(dtype=object) for column in song_listing.COLUMNS})
+
+        # work on categorical codes while filtering/deduplicating, it's much cheaper than hashing strings
+        # (columnar listings come in as categoricals already)
+        index_columns = ["key", "steptype", "difficulty"]
+        df = df.astype({column: "category" for column in index_columns})
+
+        # implement IGNORED_PACKS list
+        # (pack name only needs working out once per song rather than once per chart)
+        keys = df["key"].cat.categories.to_series()
+        packs = keys.str.strip("/").str.split("/", n=1).str[0]
+        ignored = packs.isin(packs_to_ignore).to_numpy()
+        df = df[~ignored[df["key"].cat.codes.to_numpy()]]
+
+        # if a duplicate difficulty is encountered, name it "Edit", "Edit-1", Edit-2", ...
+        n = df.groupby(index_columns, sort=False, observed=True).cumcount()
+        df = df.astype({column: object for column in index_columns})
+        duplicate = n > 0
+        df.loc[duplicate, "difficulty"] = df.loc[duplicate, "difficulty"] + "-" + n[duplicate].astype(str)
+
+        df_availablesongs = df.astype({"song": object, "meter": "int64"}).set_index(index_columns)
 
+        add_rows(len(df_availablesongs))
         self.availablesongs = df_availablesongs
 
 
@@ -177,13 +356,47 @@ class TableStats(TableStatsConstructing):
     playedsongs: Optional[pd.DataFrame] = None
     highscores: Optional[pd.DataFrame] = None
 
-    # data from Save/Upload folder
+    # playedsongs of each file, when loaded from several Stats.xml files (see fill_stats_xmls),
+    # with an extra `source` column
+    playedsongs_by_source: Optional[pd.DataFrame] = None
+
+    # data from Save/Upload folder (see upload_data.py): every play,
+    # and the daily playcount of every chart rolled up from them
     uploaddata: Optional[pd.DataFrame] = None
+    dailyplays: Optional[pd.DataFrame] = None
 
     # data from Songs folder
     availablesongs: Optional[pd.DataFrame] = None
 
+    # memoized derived tables, see memoize()
+    _memo: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def memory_report(self) -> pd.DataFrame:
+        """
+        Memory used by each table, counting string contents (doesn't compute any tables that aren't cached yet).
+        (table) -> (rows, MB)
+        """
+        tables = [
+            "playedsongs",
+            "highscores",
+            "playedsongs_by_source",
+            "uploaddata",
+            "dailyplays",
+            "availablesongs",
+            "combined",
+            "song_shorthand",
+            "pack_info",
+        ]
+        report = {}
+        for name in tables:
+            # cached properties live in the instance dict once computed
+            df = self.__dict__.get(name)
+            if df is not None:
+                report[name] = (len(df), df.memory_usage(index=True, deep=True).sum() / 2**20)
+        return pd.DataFrame.from_dict(report, orient="index", columns=["rows", "MB"])
+
     @cached_property
+    @timed()
     def song_shorthand(self) -> pd.DataFrame:
         """
         Lookup table for various shorthand descriptions of the chart.
@@ -192,25 +405,44 @@ class TableStats(TableStatsConstructing):
             - tag: just the difficulty part: "SX12", "DX10"
             - full: human readable version of the steptype: "Single", "Double"
         """
+        combined = self.combined
+        index = combined.index
 
-        def shorthand(row) -> tuple:  # noqa: ANN001
-            """Return a string like `(song name) SX10`"""
-            # potential future idea: display edit name? (song name) SZ69 iunno
-            steptype = row.name[1]
+        def per_chart(level: str, fn: Callable[[str], str]) -> pd.Series:
+            """Apply fn to each distinct value of an index level, then spread the results out to every chart."""
+            i = index.names.index(level)
+            values = np.array([fn(v) for v in index.levels[i]], dtype=object)
+            return pd.Series(values[index.codes[i]], index=index)
+
+        def steptype_letter(steptype: str) -> str:
+            return t.single_letter if (t := constants.modes.get(steptype)) else steptype
+
+        def difficulty_letter(difficulty: str) -> str:
             # this .partition() is to undo the diff name mangling done for edits: "Edit-1", "Edit-2", etc.
-            diff = row.name[2].partition("-")[0]
-            s = t.single_letter if (t := constants.modes.get(steptype)) else steptype
-            d = t.single_letter if (t := constants.diffs.get(diff)) else diff
-            sfull = t.full_name if (t := constants.modes.get(steptype)) else steptype
-            meter = "" if pd.isna(row.meter) else int(row.meter)
-            dtag = f"{s}{d}{meter}"
-            return (f"{row.song} {dtag}", dtag, sfull)
-
-        song_shorthand = self.combined.apply(shorthand, axis=1, result_type="expand")
-        song_shorthand = song_shorthand.rename(columns=dict(enumerate(["shorthand", "dtag", "stepfull"])))
+            # potential future idea: display edit name? (song name) SZ69 iunno
+            diff = difficulty.partition("-")[0]
+            return t.single_letter if (t := constants.diffs.get(diff)) else diff
+
+        def steptype_full_name(steptype: str) -> str:
+            return t.full_name if (t := constants.modes.get(steptype)) else steptype
+
+        # meter is left blank for charts missing from the song listing
+        meter = pd.Series("", index=index, dtype=object)
+        known = combined["meter"].notna()
+        meter[known] = combined.loc[known, "meter"].astype("int64").astype(str)
+
+        dtag = per_chart("steptype", steptype_letter) + per_chart("difficulty", difficulty_letter) + meter
+        song_shorthand = pd.DataFrame(
+            {
+                "shorthand": combined["song"].astype(str) + " " + dtag,
+                "dtag": dtag,
+                "stepfull": per_chart("steptype", steptype_full_name),
+            }
+        )
         return song_shorthand
 
     @cached_property
+    @timed()
     def combined(self) -> pd.DataFrame:
         """(key, steptype, difficulty) -> (pack, song, meter, playcount, lastplayed)"""
         assert self.playedsongs is not None
@@ -235,6 +467,9 @@ class TableStats(TableStatsConstructing):
         s = combined.index.get_level_values("key").to_series().drop_duplicates().map(split_key)
         # convert a series of tuples to a dataframe
         s = pd.DataFrame(s.tolist(), columns=["pack", "song"], index=s.index)
+        # pack is repeated on every chart and grouped on by most analyzers, so make it categorical.
+        # categories are sorted so groupby("pack") orders packs the same way it would for plain strings
+        s["pack"] = s["pack"].astype(pd.CategoricalDtype(sorted(s["pack"].unique())))
         # update the index to be the same as combined
         v = s.join(pd.DataFrame(index=combined.index))  # update by joining on empty dataframe with index
         # Fill any empty song names with the inferred song name
@@ -244,17 +479,112 @@ class TableStats(TableStatsConstructing):
 
         return combined
 
+    def only_source(self, source: str) -> "TableStats":
+        """
+        Slice out the data from one of the files of a multi-file load (see fill_stats_xmls),
+        as if it was the only one loaded.
+        Scores that were in more than one file only come with the first of them.
+        The song listing and upload data are shared with this TableStats.
+        """
+        if self.playedsongs_by_source is None:
+            raise ValueError("not loaded from several Stats.xml files")
+        by_source = self.playedsongs_by_source
+        playedsongs = by_source[(by_source["source"] == source).to_numpy()].drop(columns="source")
+        highscores = self.highscores[(self.highscores["source"] == source).to_numpy()]
+        highscores = rank_leaderboards(highscores).drop(columns="source")
+        highscores["player"] = highscores["player"].cat.remove_unused_categories()
+        return TableStats(
+            playedsongs=playedsongs,
+            highscores=highscores,
+            uploaddata=self.uploaddata,
+            dailyplays=self.dailyplays,
+            availablesongs=self.availablesongs,
+        )
+
+    def memoize(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """
+        Return compute(), only computing it the first time it's asked for with this key.
+        For derived tables which get asked for over and over with the same arguments.
+        Don't modify what comes back, it's shared between callers.
+        """
+        try:
+            return self._memo[key]
+        except KeyError:
+            value = self._memo[key] = compute()
+            return value
+
+    def invalidate(self, changed: Optional[Iterable[str]] = None) -> None:
+        """
+        Forget the derived tables computed from the loaded tables named in `changed` (all of them if None),
+        after those were loaded again. They get computed from the new data the next time they're asked for,
+        the others are kept. Memoized tables missing from DERIVED_FROM are forgotten whenever anything changed.
+        """
+        changed = set(changed) if changed is not None else None
+
+        def stale(name: Hashable) -> bool:
+            return changed is None or bool(DERIVED_FROM.get(name, changed) & changed)
+
+        for name in ["combined", "song_shorthand", "pack_info", "chart_flags", "highscore_flags"]:
+            # cached properties live in the instance dict once computed
+            if stale(name):
+                self.__dict__.pop(name, None)
+        self._memo = {key: value for key, value in self._memo.items() if not stale(key[0])}
+
+    def _flags(self, index: pd.MultiIndex, pack: pd.Series) -> pd.DataFrame:
+        """Filter masks for rows with the given chart index and (categorical) pack names."""
+        # pack-level flags only need working out once per pack
+        packs = pack.cat.categories.to_series()
+        is_ddr = (packs.str.contains("DDR") | packs.str.contains("DanceDanceRevolution")).to_numpy()
+        return pd.DataFrame(
+            {
+                "is_available": index.isin(self.availablesongs.index),
+                "is_mem": (pack == "@mem").to_numpy(),
+                "is_ddr": is_ddr[pack.cat.codes.to_numpy()],
+            },
+            index=index,
+        )
+
+    @cached_property
+    @timed()
+    def chart_flags(self) -> pd.DataFrame:
+        """
+        Precomputed filter masks for `combined`, row for row, see song_data().
+        (key, steptype, difficulty) -> (is_available, is_mem, is_ddr)
+        """
+        return self._flags(self.combined.index, self.combined["pack"])
+
+    @cached_property
+    @timed()
+    def highscore_flags(self) -> pd.DataFrame:
+        """
+        Precomputed filter masks for `highscores`, row for row, see leaderboards().
+        (key, steptype, difficulty) -> (is_available, is_mem, is_ddr)
+        """
+        pack = self.highscores.join(self.pack_info["pack"])["pack"]
+        return self._flags(self.highscores.index, pack)
+
+    @staticmethod
+    def _filter(
+        df: pd.DataFrame, flags: pd.DataFrame, keep_unavailable: bool, with_mem: bool, with_ddr: bool
+    ) -> pd.DataFrame:
+        mask = np.ones(len(df), dtype=bool)
+        if not with_ddr:
+            mask &= ~flags["is_ddr"].to_numpy()
+        if not with_mem:
+            mask &= ~flags["is_mem"].to_numpy()
+        if not keep_unavailable:
+            mask &= flags["is_available"].to_numpy()
+        return df if mask.all() else df[mask]
+
     def song_data(self, keep_unavailable: bool = True, with_mem: bool = False) -> pd.DataFrame:
         """
         Grab song list data.
         (key, steptype, difficulty) -> (pack, song, meter, playcount, lastplayed)
         """
-        df = self.combined
-        if not with_mem:
-            df = df[df.pack != "@mem"]
-        if not keep_unavailable:
-            df = df[df.index.isin(self.availablesongs.index)]
-        return df
+        return self.memoize(
+            ("song_data", keep_unavailable, with_mem),
+            lambda: self._filter(self.combined, self.chart_flags, keep_unavailable, with_mem, with_ddr=True),
+        )
 
     def leaderboards(
         self, keep_unavailable: bool = True, with_mem: bool = False, with_ddr: bool = True
@@ -266,20 +596,13 @@ class TableStats(TableStatsConstructing):
             - player: 4 character leaderboard name
             - score: number between 0 and 1
         """
-        df = self.highscores
-
-        # join pack column so we can filter on it, drop it later
-        df = df.join(self.pack_info["pack"])
-        if not with_ddr:
-            ddr_song_list = df[df.pack.str.contains("DDR") | df.pack.str.contains("DanceDanceRevolution")].index
-            df = df[~df.index.isin(ddr_song_list)]
-        if not with_mem:
-            df = df[df.pack != "@mem"]
-        if not keep_unavailable:
-            df = df[df.index.isin(self.availablesongs.index)]
-        return df.drop("pack", axis="columns")
+        return self.memoize(
+            ("leaderboards", keep_unavailable, with_mem, with_ddr),
+            lambda: self._filter(self.highscores, self.highscore_flags, keep_unavailable, with_mem, with_ddr),
+        )
 
     @cached_property
+    @timed()
     def pack_info(self) -> pd.DataFrame:
         """
         Lookup table from song key -> pack name and song title.
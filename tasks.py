@@ -0,0 +1,82 @@
+"""
+Small dependency-aware task runner.
+
+Tasks are named callables which can depend on other tasks finishing first.
+Independent tasks run concurrently in a thread pool: the heavy lifting is in pandas/numpy,
+and threads share the loaded data tables instead of having to copy them to other processes.
+
+>>> results = run_tasks({
+...     "a": Task(load_a),
+...     "b": Task(load_b),
+...     "c": Task(combine, deps=("a", "b")),  # runs once a and b are done
+... }, jobs=2)
+"""
+
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True)
+class Task:
+    """A unit of work, run once all the tasks named in `deps` have finished."""
+
+    fn: Callable[[], Any]
+    deps: tuple[str, ...] = ()
+
+
+def execution_order(tasks: dict[str, Task]) -> list[str]:
+    """Order the tasks so each comes after its dependencies (ties broken by insertion order)."""
+    order = []
+    state = {}  # name -> "visiting" / "done"
+
+    def visit(name: str, path: tuple[str, ...]) -> None:
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"dependency cycle: {' -> '.join((*path, name))}")
+        if name not in tasks:
+            raise ValueError(f"{path[-1]} depends on unknown task {name}")
+        state[name] = "visiting"
+        for dep in tasks[name].deps:
+            visit(dep, (*path, name))
+        state[name] = "done"
+        order.append(name)
+
+    for name in tasks:
+        visit(name, ())
+    return order
+
+
+def run_tasks(tasks: dict[str, Task], jobs: int = 1) -> dict[str, Any]:
+    """
+    Run every task, each after the tasks it depends on, with up to `jobs` running at once.
+    With jobs=1 everything runs in order on the calling thread.
+    Returns {task name: return value}. If a task raises, no more tasks are started and the exception is re-raised.
+    """
+    order = execution_order(tasks)
+    results = {}
+    if jobs <= 1:
+        for name in order:
+            results[name] = tasks[name].fn()
+        return results
+
+    pending = list(order)
+    running: dict[Future, str] = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            # start everything whose dependencies are done
+            for name in [n for n in pending if all(dep in results for dep in tasks[n].deps)]:
+                pending.remove(name)
+                running[pool.submit(tasks[name].fn)] = name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                if future.exception() is not None:
+                    for other in running:
+                        other.cancel()
+                    raise future.exception()
+                results[name] = future.result()
+    return results
@@ -0,0 +1,231 @@
+"""
+Per-play records from the Save/Upload folder.
+
+After every stage StepMania writes a small XML file to Save/Upload (named after the date, e.g.
+`2024-01-31 12345678.xml`) with the score each player just got, as `HighScoreForASongAndSteps` entries
+like the ones in the RecentSongScores section of Stats.xml. Stats.xml only keeps a playcount, the last
+play and the best scores of each chart; the upload files are a record of every single play.
+
+A cab collects thousands of these files. Most of the time goes into opening them rather than parsing,
+so they're read by a pool of threads. The load remembers which files it read (by name, size and mtime)
+and the rows each one gave, so later loads only read the files that are new since then.
+The daily playcount of every chart (the `dailyplays` table, which the play history analyzers are built on)
+is kept up to date the same way: the plays from new files are added to it, those from deleted files taken out.
+
+>>> state = fill_upload_data(stats, Path("Save/Upload"))  # reads every file
+>>> ...  # more songs are played
+>>> state = fill_upload_data(stats, Path("Save/Upload"), previous=state)  # reads just the new files
+"""
+
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from profiling import add_rows, timed
+from table_stats import TableStats, song_key
+
+COLUMNS = ["timestamp", "key", "steptype", "difficulty", "score", "player", "mods"]
+# the same few values over and over, stored once each
+CATEGORIES = ["key", "steptype", "difficulty", "player", "mods"]
+CHART = ["key", "steptype", "difficulty"]
+DAILY_COLUMNS = ["day", *CHART, "plays"]
+
+
+def upload_files(path_to_upload: Path) -> dict[str, tuple[int, int]]:
+    """
+    (size, mtime) of every upload file in the folder, in name order (which is the order they were written in).
+    (Plain names and os.scandir: with hundreds of thousands of files, Path objects and glob add up.)
+    """
+    if not path_to_upload.is_dir():
+        raise FileNotFoundError(f"No upload folder at {path_to_upload}")
+    files = {}
+    with os.scandir(path_to_upload) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".xml"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                # deleted in the meantime
+                continue
+            files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return dict(sorted(files.items()))
+
+
+def upload_file_rows(path: Path, packs_to_ignore: set[str]) -> Optional[list[tuple]]:
+    """
+    Rows for the uploaddata table from one upload file, one per player who played the stage.
+    Course plays (RecentCourseScores) aren't included.
+    Edits are all called "Edit": the file doesn't say which of a song's edits was played,
+    so they can't be numbered like in the playedsongs table.
+    Returns None if the file can't be read, e.g. because the game is still writing it.
+    """
+    try:
+        root = ET.fromstring(path.read_bytes())
+    except (OSError, ET.ParseError):
+        return None
+
+    rows = []
+    for entry in root.iterfind("RecentSongScores/HighScoreForASongAndSteps"):
+        key, pack = song_key(entry.find("Song").get("Dir"))
+        if pack in packs_to_ignore:
+            continue
+        steps = entry.find("Steps")
+        score = entry.find("HighScore")
+        rows.append(
+            (
+                datetime.fromisoformat(score.find("DateTime").text),
+                key,
+                steps.get("StepsType"),
+                steps.get("Difficulty"),
+                float(score.find("PercentDP").text),
+                score.find("Name").text,
+                score.find("Modifiers").text,
+            )
+        )
+    return rows
+
+
+def upload_frame(rows: list[tuple]) -> pd.DataFrame:
+    """Build the uploaddata table from rows of upload_file_rows() (not sorted)"""
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    # (so the dtypes are right even without any rows)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df["score"] = df["score"].astype(float)
+    return categorize(df)
+
+
+def categorize(df: pd.DataFrame) -> pd.DataFrame:
+    """Store the string columns as categoricals, with just the values that are there (in sorted order)"""
+    return df.astype({column: object for column in CATEGORIES}).astype({column: "category" for column in CATEGORIES})
+
+
+def daily_playcounts(uploaddata: pd.DataFrame) -> pd.DataFrame:
+    """
+    Roll plays up into the daily playcount of every chart.
+    (index) -> (day, key, steptype, difficulty, plays), in order of day (then chart)
+    """
+    return add_daily_playcounts([play_counts(uploaddata)])
+
+
+def play_counts(uploaddata: pd.DataFrame, plays: int = 1) -> pd.DataFrame:
+    """Rows of uploaddata as a (not yet added up) daily playcount table, each row counting `plays`"""
+    return uploaddata[CHART].assign(day=uploaddata["timestamp"].dt.normalize(), plays=plays)[DAILY_COLUMNS]
+
+
+def add_daily_playcounts(tables: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Add up daily playcount tables (or the rows of play_counts()), leaving out charts whose plays on a day
+    come to 0. The result is the same no matter how the plays were split between the tables.
+    """
+    df = pd.concat(tables).astype({column: object for column in CHART})
+    daily = df.groupby(["day", *CHART], sort=True)["plays"].sum().reset_index()
+    daily = daily[(daily["plays"] != 0).to_numpy()].reset_index(drop=True)
+    daily["day"] = pd.to_datetime(daily["day"])
+    return daily.astype({"plays": np.int64, **{column: "category" for column in CHART}})
+
+
+@dataclass
+class UploadState:
+    """
+    Result of loading an upload folder, with what's needed to load it again incrementally:
+    the (size, mtime) of every file that was read, in name order, and the file each row came from
+    (as a position in `files`). `dailyplays` is the daily_playcounts() of uploaddata.
+    """
+
+    options: dict
+    uploaddata: pd.DataFrame
+    dailyplays: pd.DataFrame
+    files: dict[str, tuple[int, int]]
+    row_file: np.ndarray
+    # files read in this load (all of them for a full load)
+    parsed: int = 0
+
+    def summary(self) -> str:
+        """How the load went, for the user"""
+        return f"read {self.parsed} new of {len(self.files)} upload files"
+
+
+@timed()
+def fill_upload_data(
+    stats: TableStats,
+    path_to_upload: Path,
+    previous: Optional[UploadState] = None,
+    jobs: Optional[int] = None,
+    packs_to_ignore: Optional[set[str]] = None,
+) -> UploadState:
+    """
+    Fill the `uploaddata` table of `stats` with every play recorded in the Save/Upload folder:
+    (index) -> (timestamp, key, steptype, difficulty, score, player, mods), in order of time.
+    Only files that are new or changed since the load `previous` came from are read,
+    in up to `jobs` threads (the ThreadPoolExecutor default if None).
+    Returns the state to pass as `previous` next time.
+
+    packs_to_ignore: Pack names to not include, as for TableStats.fill_stats_xml.
+    """
+    options = {"packs_to_ignore": set(packs_to_ignore or ())}
+    if previous is not None and previous.options != options:
+        previous = None
+    known = previous.files if previous is not None else {}
+
+    signatures = upload_files(path_to_upload)
+    to_read = [path_to_upload / name for name, signature in signatures.items() if known.get(name) != signature]
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        read = dict(
+            zip(
+                (path.name for path in to_read),
+                pool.map(partial(upload_file_rows, packs_to_ignore=options["packs_to_ignore"]), to_read),
+            )
+        )
+
+    # files that couldn't be read are left out, and tried again next time
+    files = {name: signature for name, signature in signatures.items() if read.get(name, ()) is not None}
+    position = {name: i for i, name in enumerate(files)}
+    rows = []
+    row_file = []
+    for name, file_rows in read.items():
+        if file_rows is not None:
+            rows += file_rows
+            row_file += [position[name]] * len(file_rows)
+    df = upload_frame(rows)
+    row_file = np.array(row_file, dtype=np.int64)
+    new_plays = df
+
+    if previous is not None:
+        # old file position -> new position, -1 if the file is gone or was read again
+        file_map = np.array(
+            [position[name] if name in position and name not in read else -1 for name in previous.files],
+            dtype=np.int64,
+        )
+        moved = file_map[previous.row_file]
+        kept = moved >= 0
+        if kept.any():
+            # the categories have to come out the same as a full load would make them
+            df = categorize(pd.concat([previous.uploaddata.iloc[np.flatnonzero(kept)], df]))
+            row_file = np.concatenate([moved[kept], row_file])
+
+    # plays at the same time stay in file order, and in their order within the file (stable sort)
+    order = np.lexsort((row_file, df["timestamp"].to_numpy()))
+    df = df.iloc[order].reset_index(drop=True)
+    row_file = row_file[order]
+
+    if previous is None:
+        dailyplays = daily_playcounts(df)
+    else:
+        # patch the old rollup: take out the plays of files that are gone (or were read again), add the new ones
+        dropped = previous.uploaddata.iloc[np.flatnonzero(moved < 0)]
+        dailyplays = add_daily_playcounts([previous.dailyplays, play_counts(dropped, -1), play_counts(new_plays)])
+
+    add_rows(len(rows))
+    stats.uploaddata = df
+    stats.dailyplays = dailyplays
+    return UploadState(options, df, dailyplays, files, row_file, parsed=len(read))
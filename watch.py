@@ -0,0 +1,187 @@
+"""
+Watch mode (main.py --watch): keep the data in memory and make the report again whenever the input files change.
+
+A cold run of main.py spends most of its time importing, parsing and working out the derived tables.
+Here all of that stays loaded between reports. The input files are polled, and when one changes only it is loaded
+again (Stats.xml and the upload folder incrementally, see stats_delta.py and upload_data.py), and only the derived
+tables computed from it are thrown away (see TableStats.invalidate), the rest are reused.
+
+Polling rather than OS change notifications: no extra dependency, and it works for a cab's drive shared over the
+network too. A file is only loaded once it's looked the same in two polls in a row, so a Stats.xml still being
+written isn't picked up halfway. The upload folder is compared file by file, so an upload file which couldn't be
+read yet is read once the game has finished writing it.
+
+>>> watcher = ReportWatcher({"Stats.xml": Path("Stats.xml")}, Path("song_listing.csv"))
+>>> write_report(watcher.stats)
+>>> watcher.watch(write_report)  # until interrupted
+"""
+
+import time
+import xml.etree.ElementTree as ET
+from collections.abc import Callable, Mapping
+from pathlib import Path
+from typing import Optional
+
+import stats_delta
+import upload_data
+from profiling import timed
+from table_stats import TableStats
+
+# input kind -> the TableStats tables it's loaded into
+INPUT_TABLES = {
+    "stats": {"playedsongs", "highscores", "playedsongs_by_source"},
+    "listing": {"availablesongs"},
+    "upload": {"uploaddata", "dailyplays"},
+}
+
+# an input: (kind, name), the name is the source name for Stats.xml files
+Input = tuple[str, Optional[str]]
+
+
+def signature(path: Path) -> Optional[tuple[int, int]]:
+    """
+    (size, mtime) of a file or folder, None if it isn't there.
+    (A folder's mtime changes when files are added to it or deleted, which is what happens in Save/Upload.)
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def upload_signature(path: Path) -> Optional[tuple[int, int]]:
+    """
+    Signature of an upload folder: (number of files, hash of their sizes and mtimes), None if it isn't there.
+    (Its own mtime isn't enough: it doesn't change when a file that's being written is finished.)
+    """
+    try:
+        files = upload_data.upload_files(path)
+    except OSError:
+        return None
+    return (len(files), hash(tuple(files.items())))
+
+
+class ReportWatcher:
+    """Inputs of a report, loaded into `stats` and kept up to date with the files."""
+
+    def __init__(
+        self,
+        sources: Mapping[str, Path],
+        path_to_listing: Path,
+        path_to_upload: Optional[Path] = None,
+        jobs: Optional[int] = None,
+    ) -> None:
+        """
+        Load everything, see main.py for the arguments.
+        jobs: Number of threads to read upload files with.
+        """
+        self.stats = TableStats()
+        self.sources = dict(sources)
+        self.path_to_listing = path_to_listing
+        self.path_to_upload = path_to_upload
+        self.jobs = jobs
+        # previous loads, to patch on the next one
+        self.stats_states: dict[str, stats_delta.StatsXmlState] = {}
+        self.upload_state: Optional[upload_data.UploadState] = None
+        # input -> signature when it was last loaded
+        self.loaded: dict[Input, Optional[tuple[int, int]]] = {}
+        # input -> signature at the last poll
+        self.seen = {input_: self.signature(input_, path) for input_, path in self.inputs().items()}
+        self.reload(set(self.seen))
+
+    def inputs(self) -> dict[Input, Path]:
+        """Every input file (or folder)"""
+        inputs = {("stats", name): path for name, path in self.sources.items()}
+        inputs["listing", None] = self.path_to_listing
+        if self.path_to_upload is not None:
+            inputs["upload", None] = self.path_to_upload
+        return inputs
+
+    def signature(self, input_: Input, path: Path) -> Optional[tuple[int, int]]:
+        """Signature of an input, which changes when it does"""
+        return upload_signature(path) if input_[0] == "upload" else signature(path)
+
+    def poll(self) -> set[Input]:
+        """Find the inputs that changed since they were loaded, and have stayed the same since the last poll"""
+        settled = set()
+        for input_, path in self.inputs().items():
+            current = self.signature(input_, path)
+            if current != self.loaded.get(input_) and current == self.seen.get(input_):
+                settled.add(input_)
+            self.seen[input_] = current
+        return settled
+
+    @timed()
+    def reload(self, inputs: set[Input]) -> set[str]:
+        """
+        Load the given inputs again, forgetting the derived tables computed from them.
+        Returns the names of the tables that were loaded.
+        If loading one fails, the error is raised: the inputs loaded before it are taken care of,
+        those after it are still changed for the next poll, and the one that failed is tried again once it changes.
+        The derived tables of the one that failed are forgotten too, as some of its tables may have been replaced
+        (e.g. the other Stats.xml sources, see load_stats).
+        """
+        changed = set()
+        for kind in INPUT_TABLES:
+            if not any(input_kind == kind for input_kind, _ in inputs):
+                continue
+            for input_ in inputs:
+                if input_[0] == kind:
+                    self.loaded[input_] = self.seen[input_]
+            try:
+                if kind == "stats":
+                    self.load_stats({name for input_kind, name in inputs if input_kind == "stats"})
+                elif kind == "listing":
+                    self.stats.fill_song_listing(self.path_to_listing)
+                else:
+                    self.upload_state = upload_data.fill_upload_data(
+                        self.stats, self.path_to_upload, self.upload_state, jobs=self.jobs
+                    )
+            finally:
+                self.stats.invalidate(INPUT_TABLES[kind])
+            changed |= INPUT_TABLES[kind]
+        return changed
+
+    def load_stats(self, names: set[str]) -> None:
+        """Load the named Stats.xml sources again, patching their previous loads"""
+        if len(self.sources) == 1:
+            [(name, path)] = self.sources.items()
+            self.stats_states[name] = stats_delta.fill_stats_xml(self.stats, path, self.stats_states.get(name))
+            return
+
+        try:
+            for name in [name for name in self.sources if name in names]:
+                self.stats_states[name] = stats_delta.fill_stats_xml(
+                    TableStats(), self.sources[name], self.stats_states.get(name)
+                )
+        finally:
+            # (if one fails, the others still go in, with the previous load of the one that failed)
+            if self.stats_states.keys() == self.sources.keys():
+                self.stats.merge_stats_sources(
+                    {
+                        name: (self.stats_states[name].playedsongs, self.stats_states[name].highscores)
+                        for name in self.sources
+                    }
+                )
+
+    def watch(self, on_change: Callable[[TableStats], None], interval: float = 0.25) -> None:
+        """
+        Call on_change(stats) after the inputs change and are loaded again, polling every `interval` seconds.
+        Runs until interrupted (KeyboardInterrupt).
+        """
+        while True:
+            time.sleep(interval)
+            inputs = self.poll()
+            if not inputs:
+                continue
+
+            start = time.perf_counter()
+            names = ", ".join(sorted(str(self.inputs()[input_]) for input_ in inputs))
+            print(f"Changed: {names}")
+            try:
+                self.reload(inputs)
+            except (OSError, ET.ParseError, ValueError) as e:
+                print(f"  couldn't load it, keeping the previous data until it changes again: {e!r}")
+            on_change(self.stats)
+            print(f"  report updated in {time.perf_counter() - start:.2f}s")